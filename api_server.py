@@ -4,23 +4,39 @@ Processamento de exames médicos com OCR avançado
 """
 
 import os
+import json
 import time
 import hashlib
 import traceback
 import signal
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
-from functools import wraps
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from functools import wraps, lru_cache
+from concurrent.futures import Future
+from secrets import token_hex
 
-from flask import Flask, request, jsonify, make_response # send_file não é usado, removido
+from flask import Flask, request, jsonify, make_response, abort # send_file não é usado, removido
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 import redis
 import structlog
+import numpy as np
 
 import config as config_module
 from medical_ocr import MedicalOCRProcessor
 from utils.image_processor import ImageProcessor
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _orjson_serializer(event_dict, **kwargs) -> str:
+    """Serializador do JSONRenderer via orjson (structlog espera str)"""
+    return orjson.dumps(event_dict, default=kwargs.get('default'), option=orjson.OPT_NON_STR_KEYS).decode()
+
 # Configurar logging estruturado
 structlog.configure(
     processors=[
@@ -32,7 +48,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=_orjson_serializer) if ORJSON_AVAILABLE else structlog.processors.JSONRenderer()
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -44,6 +60,15 @@ logger = structlog.get_logger()
 # Inicializar Flask
 app = Flask(__name__)
 
+# Folga para os cabeçalhos multipart e campos de formulário além do arquivo
+MULTIPART_OVERHEAD = 64 * 1024
+
+# O Werkzeug rejeita (413) corpos maiores que isto antes de bufferizá-los.
+# O limite global comporta um lote completo; o /ocr aplica o limite de um arquivo.
+app.config['MAX_CONTENT_LENGTH'] = (
+    config_module.config.MAX_FILE_SIZE * config_module.config.BATCH_MAX_FILES + MULTIPART_OVERHEAD
+)
+
 # Configurar Flask-CORS
 # Permitir localhost para desenvolvimento e produção para essencialab.app
 allowed_origins = [
@@ -88,7 +113,13 @@ REDIS_URL = os.getenv("REDIS_URL")  # sem default para localhost
 redis_client = None
 if REDIS_URL:
     try:
-        redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+        # Pool explícito e compartilhado entre as threads/greenlets do worker
+        redis_pool = redis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=config_module.config.REDIS_MAX_CONNECTIONS,
+            decode_responses=True
+        )
+        redis_client = redis.Redis(connection_pool=redis_pool)
         redis_client.ping()
         logger.info("Redis conectado.")
     except Exception as e:
@@ -98,41 +129,42 @@ if REDIS_URL:
 # Inicialização lazy dos processadores para evitar timeout no boot
 ocr_processor: Optional[MedicalOCRProcessor] = None
 image_processor: Optional[ImageProcessor] = None
-_initialization_lock = False
+_initialization_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
 
 def initialize_processors():
-    """Inicializa os processadores de forma lazy"""
-    global ocr_processor, image_processor, _initialization_lock
+    """Inicializa os processadores de forma lazy (thread-safe)"""
+    global ocr_processor, image_processor
     
-    if _initialization_lock:
-        logger.info("Inicialização já em andamento, aguardando...")
-        return
-    
-    _initialization_lock = True
-    try:
-        logger.info("Inicializando processadores...")
-        start_time = time.time()
-        
-        # Inicializar processadores com cache em memória
-        ocr_processor = MedicalOCRProcessor()
-        image_processor = ImageProcessor()
-        
-        # Pré-aquecer o OCR com uma imagem de teste para garantir que os modelos estão carregados
-        logger.info("Pré-aquecendo modelos OCR...")
-        ocr_processor.test_connection()
+    with _initialization_lock:
+        # Outra thread (ex.: o aquecimento) pode ter concluído enquanto esperávamos
+        if ocr_processor is not None and image_processor is not None:
+            return
         
-        init_time = time.time() - start_time
-        logger.info(f"Processadores inicializados com sucesso em {init_time:.2f}s!")
-        
-    except Exception as e:
-        logger.error("Erro ao inicializar processadores", error=str(e))
-        ocr_processor = None
-        image_processor = None
-    finally:
-        _initialization_lock = False
+        try:
+            logger.info("Inicializando processadores...")
+            start_time = time.time()
+            
+            # Inicializar processadores com cache em memória
+            ocr = MedicalOCRProcessor()
+            img = ImageProcessor()
+            
+            # Confirmar que o OCR responde (o aquecimento roda na criação dos engines)
+            logger.info("Verificando modelos OCR...")
+            ocr.test_connection()
+            
+            # Publicar só depois do aquecimento, para o /health não reportar "loaded" cedo demais
+            ocr_processor, image_processor = ocr, img
+            
+            init_time = time.time() - start_time
+            logger.info(f"Processadores inicializados com sucesso em {init_time:.2f}s!")
+            
+        except Exception as e:
+            logger.error("Erro ao inicializar processadores", error=str(e))
+            ocr_processor = None
+            image_processor = None
 
 def get_ocr_processor() -> MedicalOCRProcessor:
-    global ocr_processor
     if ocr_processor is None:
         logger.info("OCR processor não inicializado, inicializando agora...")
         initialize_processors()
@@ -141,7 +173,6 @@ def get_ocr_processor() -> MedicalOCRProcessor:
     return ocr_processor
 
 def get_image_processor() -> ImageProcessor:
-    global image_processor
     if image_processor is None:
         logger.info("Image processor não inicializado, inicializando agora...")
         initialize_processors()
@@ -149,19 +180,35 @@ def get_image_processor() -> ImageProcessor:
             raise RuntimeError("Falha ao inicializar Image processor")
     return image_processor
 
-# Função para pré-inicializar processadores quando usando --preload
+# Função para pré-inicializar processadores fora do caminho das requisições
 def preload_models():
-    """Pré-carrega modelos quando usando Gunicorn com preload_app = True"""
-    try:
-        logger.info("Pré-carregando modelos devido ao preload_app = True...")
-        initialize_processors()
-        logger.info("Modelos pré-carregados com sucesso!")
-    except Exception as e:
-        logger.error("Erro ao pré-carregar modelos", error=str(e))
+    """Dispara o carregamento dos modelos em uma thread de aquecimento"""
+    global _warmup_thread
+    
+    def _warmup():
+        try:
+            logger.info("Pré-carregando modelos em background...")
+            initialize_processors()
+            logger.info("Modelos pré-carregados com sucesso!")
+        except Exception as e:
+            logger.error("Erro ao pré-carregar modelos", error=str(e))
+    
+    _warmup_thread = threading.Thread(target=_warmup, name="ocr-warmup", daemon=True)
+    _warmup_thread.start()
 
-# Como configuramos preload_app = True no gunicorn.conf.py,
-# podemos simplesmente chamar a inicialização diretamente
-# O Gunicorn cuidará do preload automaticamente
+def wait_for_warmup(timeout: Optional[float] = None) -> bool:
+    """Aguarda o fim do aquecimento; retorna True se os processadores estão prontos.
+    
+    Com preload_app = True o Gunicorn chama isto no master antes do fork
+    (ver gunicorn.conf.py): threads não sobrevivem ao fork, e os workers
+    herdam os modelos já carregados via copy-on-write.
+    """
+    if _warmup_thread is not None:
+        _warmup_thread.join(timeout)
+    return ocr_processor is not None and image_processor is not None
+
+# A importação retorna imediatamente; requisições que chegarem antes do fim do
+# aquecimento aguardam no lock em vez de inicializar os modelos em dobro
 preload_models()
 
 def require_api_key(f):
@@ -189,22 +236,54 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated_function
 
+@lru_cache(maxsize=2048)
+def _canonical_params(params_items: Tuple[Tuple[str, Any], ...]) -> bytes:
+    """Serialização canônica dos parâmetros (memoizada: quase todas as
+    requisições usam o mesmo punhado de combinações)"""
+    return json.dumps(dict(params_items), sort_keys=True, separators=(',', ':')).encode()
+
 def get_cache_key(file_hash: str, params: Dict[str, Any]) -> str:
-    """Gera chave de cache baseada no hash do arquivo e parâmetros"""
-    params_str = str(sorted(params.items()))
-    cache_data = f"{file_hash}:{params_str}"
-    return hashlib.md5(cache_data.encode()).hexdigest()
+    """Gera chave de cache baseada no hash do arquivo e parâmetros
+    
+    Os parâmetros são serializados de forma canônica (JSON compacto com chaves
+    ordenadas) em vez do repr() do Python, e o digest usa BLAKE2b da stdlib.
+    """
+    h = hashlib.blake2b(file_hash.encode(), digest_size=16)
+    h.update(_canonical_params(tuple(sorted(params.items()))))
+    return h.hexdigest()
+
+def get_file_extension(filename: str) -> str:
+    """Extensão do arquivo em minúsculas ('' se não houver), para testar em ALLOWED_EXTENSIONS"""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
 
 def get_file_hash(file_data: bytes) -> str:
-    """Calcula hash MD5 do arquivo"""
-    return hashlib.md5(file_data).hexdigest()
+    """Calcula hash SHA-256 do arquivo (32 hex, mesmo tamanho do antigo MD5)"""
+    return hashlib.sha256(file_data).hexdigest()[:32]
+
+# Resposta do /health em cache: (instante monotônico, corpo JSON já serializado)
+HEALTH_CACHE_TTL = 1.0  # segundos
+_health_cache: Tuple[float, bytes] = (0.0, b'')
 
 @app.get("/health")
 def health():
     """
     Healthcheck otimizado que verifica se os modelos estão carregados
-    Retorna status detalhado do sistema incluindo processadores
+    
+    Chamado com alta frequência por load balancers: o corpo é reconstruído
+    (incluindo o ping no Redis) no máximo uma vez por HEALTH_CACHE_TTL.
     """
+    global _health_cache
+    now = time.monotonic()
+    built_at, body = _health_cache
+    if not body or now - built_at >= HEALTH_CACHE_TTL:
+        status = _build_health_status()
+        body = orjson.dumps(status, option=orjson.OPT_NON_STR_KEYS) if ORJSON_AVAILABLE else json.dumps(status).encode()
+        _health_cache = (now, body)
+    return app.response_class(body, mimetype='application/json')
+
+def _build_health_status() -> Dict[str, Any]:
+    """Retorna status detalhado do sistema incluindo processadores"""
     status = {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
     
     # Verificar Redis
@@ -221,7 +300,8 @@ def health():
     # Verificar se processadores estão inicializados
     status["processors"] = {
         "ocr_processor": "loaded" if ocr_processor is not None else "not_loaded",
-        "image_processor": "loaded" if image_processor is not None else "not_loaded"
+        "image_processor": "loaded" if image_processor is not None else "not_loaded",
+        "warming_up": _warmup_thread is not None and _warmup_thread.is_alive()
     }
     
     # Se usando preload, verificar se modelos estão realmente funcionais
@@ -261,7 +341,7 @@ def api_info():
             '/batch': 'Processamento em lote (POST)',
             '/test': 'Rota de teste simples (se mantida)'
         },
-        'supported_formats': config_module.config.ALLOWED_EXTENSIONS,
+        'supported_formats': sorted(config_module.config.ALLOWED_EXTENSIONS),
         'max_file_size': config_module.config.MAX_FILE_SIZE,
         'languages': [config_module.config.PADDLE_OCR_LANG],
         'features': {
@@ -281,10 +361,14 @@ def test_route():
 def process_ocr():
     """Endpoint principal para processamento OCR"""
     start_time = time.time()
-    request_id = hashlib.md5(f"{time.time()}".encode()).hexdigest()[:8]
+    request_id = token_hex(4)
     auth_header_present = bool(request.headers.get('Authorization'))
     logger.info("Iniciando processamento OCR", request_id=request_id, auth_header_present=auth_header_present)
     
+    # Rejeitar pelo Content-Length antes de ler o corpo
+    if request.content_length and request.content_length > config_module.config.MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+        abort(413)
+    
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'Nenhum arquivo enviado', 'message': 'Envie um arquivo no campo "file"'}), 400
@@ -293,9 +377,9 @@ def process_ocr():
         if file.filename == '':
             return jsonify({'error': 'Arquivo vazio', 'message': 'Selecione um arquivo válido'}), 400
         
-        file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+        file_ext = get_file_extension(file.filename)
         if file_ext not in config_module.config.ALLOWED_EXTENSIONS:
-            return jsonify({'error': 'Formato não suportado', 'message': f'Formatos aceitos: {", ".join(config_module.config.ALLOWED_EXTENSIONS)}', 'received': file_ext}), 400
+            return jsonify({'error': 'Formato não suportado', 'message': f'Formatos aceitos: {", ".join(sorted(config_module.config.ALLOWED_EXTENSIONS))}', 'received': file_ext}), 400
         
         file_data = file.read()
         if len(file_data) > config_module.config.MAX_FILE_SIZE:
@@ -306,7 +390,8 @@ def process_ocr():
             'use_gpu': request.form.get('use_gpu', str(config_module.config.ENABLE_GPU)).lower() == 'true',
             'confidence_threshold': float(request.form.get('confidence_threshold', config_module.config.CONFIDENCE_THRESHOLD)),
             'extract_tables': request.form.get('extract_tables', 'true').lower() == 'true',
-            'extract_layout': request.form.get('extract_layout', 'true').lower() == 'true'
+            'extract_layout': request.form.get('extract_layout', 'true').lower() == 'true',
+            'high_quality': request.form.get('high_quality', 'false').lower() == 'true'  # PDFs renderizados na DPI máxima
             # 'medical_parsing' foi removido
         }
         
@@ -315,7 +400,6 @@ def process_ocr():
             try:
                 cached_result_str = redis_client.get(cache_key)
                 if cached_result_str:
-                    import json # Mover import para dentro do if para evitar import desnecessário
                     cached_result = json.loads(cached_result_str)
                     logger.info("Resultado encontrado no cache", request_id=request_id, cache_key=cache_key)
                     cached_result['cached'] = True
@@ -328,20 +412,9 @@ def process_ocr():
         file_size_mb = len(file_data) / 1024 / 1024
         logger.info("Processando arquivo", request_id=request_id, filename=file.filename, size_mb=f"{file_size_mb:.2f}", file_hash=file_hash)
 
-        processed_image_data = file_data
-        if file_ext in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
-            try:
-                preproc_start = time.time()
-                img_proc = get_image_processor()
-                processed_image_data = img_proc.preprocess_image(file_data)
-                preproc_ms = int((time.time() - preproc_start) * 1000)
-                logger.info("Imagem pré-processada", request_id=request_id, preproc_ms=preproc_ms)
-            except Exception as e:
-                logger.warning("Erro no pré-processamento da imagem, usando original", error=str(e), request_id=request_id)
-
         ocr_start = time.time()
-        ocr_proc_instance = get_ocr_processor()
-        ocr_result = ocr_proc_instance.process_file(processed_image_data, file_extension=file_ext, **processing_params)
+        # Uploads idênticos simultâneos compartilham uma única execução do OCR
+        ocr_result = _single_flight(cache_key, lambda: _run_ocr(file_data, file_ext, processing_params, request_id=request_id))
         ocr_ms = int((time.time() - ocr_start) * 1000)
         total_ms = int((time.time() - start_time) * 1000)
 
@@ -350,24 +423,10 @@ def process_ocr():
 
         logger.info("OCR concluído", request_id=request_id, confidence=ocr_result.get('confidence', 0), text_length=len(ocr_result.get('text', '')), ocr_ms=ocr_ms, total_ms=total_ms)
         
-        response_data = {
-            'success': True,
-            'request_id': request_id,
-            'text': ocr_result.get('text', ''),
-            'confidence': ocr_result.get('confidence', 0),
-            'processing_time_ms': int((time.time() - start_time) * 1000),
-            'file_info': {'filename': file.filename, 'size_bytes': len(file_data), 'format': file_ext, 'hash': file_hash},
-            'ocr_details': {'provider': 'paddleocr', 'language': config_module.config.PADDLE_OCR_LANG, 'gpu_used': processing_params['use_gpu'], 'confidence_threshold': processing_params['confidence_threshold']}
-        }
-        # A extração de dados estruturados foi removida deste serviço.
-        if ocr_result.get('tables'):
-            response_data['tables'] = ocr_result['tables']
-        if ocr_result.get('layout'):
-            response_data['layout'] = ocr_result['layout']
+        response_data = _build_ocr_response(request_id, file.filename, file_data, file_ext, file_hash, ocr_result, processing_params, start_time)
         
         if redis_client and response_data['confidence'] > 0.5: # Usar confidence da resposta montada
             try:
-                import json # Mover import para dentro do if
                 # Não adicionar 'cached' ou 'cache_key' ao que é salvo no cache
                 redis_client.setex(cache_key, config_module.config.CACHE_TTL, json.dumps(response_data, ensure_ascii=False))
                 logger.info("Resultado salvo no cache", cache_key=cache_key)
@@ -377,54 +436,167 @@ def process_ocr():
         logger.info("Processamento OCR concluído com sucesso", request_id=request_id, total_time_ms=response_data['processing_time_ms'])
         return jsonify(response_data)
         
+    except RequestEntityTooLarge:
+        raise  # Tratado pelo errorhandler(413)
     except Exception as e:
         error_msg = str(e)
         error_trace = traceback.format_exc()
         logger.error("Erro crítico no processamento OCR", request_id=request_id, error=error_msg, trace=error_trace, exc_info=True)
         return jsonify({'success': False, 'error': 'Erro interno do servidor durante OCR', 'message': error_msg, 'request_id': request_id, 'processing_time_ms': int((time.time() - start_time) * 1000)}), 500
 
-def _process_single_file_for_batch(file_obj, index: int, processing_params: Dict[str, Any]) -> Dict[str, Any]:
-    """Função auxiliar para processar um único arquivo dentro de um lote."""
-    file_start_time = time.time()
+# Requisições em andamento por cache_key (single-flight): a primeira executa o OCR,
+# as idênticas que chegarem enquanto isso aguardam o mesmo Future
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _single_flight(key: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Executa fn uma única vez para chamadas concorrentes com a mesma chave"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+    
+    if not is_leader:
+        logger.info("Aguardando processamento idêntico em andamento", cache_key=key)
+        return future.result(timeout=config_module.config.MAX_PROCESSING_TIME)
+    
     try:
-        if file_obj.filename == '':
-            return {'file_index': index, 'filename': 'N/A', 'success': False, 'error': 'Arquivo vazio'}
-
-        file_ext = file_obj.filename.rsplit('.', 1)[1].lower() if '.' in file_obj.filename else ''
-        if file_ext not in config_module.config.ALLOWED_EXTENSIONS:
-            return {'file_index': index, 'filename': file_obj.filename, 'success': False, 'error': f'Formato não suportado: {file_ext}'}
+        result = fn()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
 
-        file_data = file_obj.read()
-        if len(file_data) > config_module.config.MAX_FILE_SIZE:
-            return {'file_index': index, 'filename': file_obj.filename, 'success': False, 'error': 'Arquivo muito grande'}
+# Formatos que passam pelo ImageProcessor antes do OCR (PDFs são rasterizados no OCR)
+PREPROCESS_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'bmp', 'tiff'})
 
-        processed_image_data = file_data
-        if file_ext in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
+def _run_ocr(file_data: bytes, file_ext: str, processing_params: Dict[str, Any], request_id: Optional[str] = None,
+             image_array: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Pré-processa (imagens) e executa o OCR de um arquivo
+    
+    image_array: imagem já pré-processada (lote); dispensa o pré-processamento aqui
+    """
+    processed_image_data = file_data if image_array is None else image_array
+    if image_array is None and file_ext in PREPROCESS_EXTENSIONS:
+        try:
+            preproc_start = time.time()
             img_proc = get_image_processor()
-            processed_image_data = img_proc.preprocess_image(file_data)
+            processed_image_data = img_proc.preprocess_image_array(file_data)
+            preproc_ms = int((time.time() - preproc_start) * 1000)
+            logger.info("Imagem pré-processada", request_id=request_id, preproc_ms=preproc_ms)
+        except Exception as e:
+            logger.warning("Erro no pré-processamento da imagem, usando original", error=str(e), request_id=request_id)
+
+    ocr_proc_instance = get_ocr_processor()
+    return ocr_proc_instance.process_file(processed_image_data, file_extension=file_ext, **processing_params)
+
+def _build_ocr_response(request_id: str, filename: str, file_data: bytes, file_ext: str, file_hash: str,
+                        ocr_result: Dict[str, Any], processing_params: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    """Monta a resposta do /ocr (também é o formato salvo no cache)"""
+    response_data = {
+        'success': True,
+        'request_id': request_id,
+        'text': ocr_result.get('text', ''),
+        'confidence': ocr_result.get('confidence', 0),
+        'processing_time_ms': int((time.time() - start_time) * 1000),
+        'file_info': {'filename': filename, 'size_bytes': len(file_data), 'format': file_ext, 'hash': file_hash},
+        'ocr_details': {'provider': 'paddleocr', 'language': config_module.config.PADDLE_OCR_LANG, 'gpu_used': processing_params['use_gpu'], 'confidence_threshold': processing_params['confidence_threshold']}
+    }
+    # A extração de dados estruturados foi removida deste serviço.
+    if ocr_result.get('tables'):
+        response_data['tables'] = ocr_result['tables']
+    if ocr_result.get('layout'):
+        response_data['layout'] = ocr_result['layout']
+    return response_data
+
+def _load_file_for_batch(file_obj, index: int, processing_params: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Valida e lê um arquivo do lote.
+    
+    Returns:
+        (resultado de erro, None) se o arquivo for rejeitado, ou
+        (None, entrada) com os dados, hash e chave de cache do arquivo
+    """
+    if file_obj.filename == '':
+        return {'file_index': index, 'filename': 'N/A', 'success': False, 'error': 'Arquivo vazio'}, None
+
+    file_ext = get_file_extension(file_obj.filename)
+    if file_ext not in config_module.config.ALLOWED_EXTENSIONS:
+        return {'file_index': index, 'filename': file_obj.filename, 'success': False, 'error': f'Formato não suportado: {file_ext}'}, None
+
+    file_data = file_obj.read()
+    if len(file_data) > config_module.config.MAX_FILE_SIZE:
+        return {'file_index': index, 'filename': file_obj.filename, 'success': False, 'error': 'Arquivo muito grande'}, None
+
+    file_hash = get_file_hash(file_data)
+    return None, {
+        'file_index': index,
+        'filename': file_obj.filename,
+        'file_ext': file_ext,
+        'file_data': file_data,
+        'file_hash': file_hash,
+        'cache_key': get_cache_key(file_hash, processing_params)
+    }
 
-        ocr_proc_instance = get_ocr_processor()
-        ocr_result = ocr_proc_instance.process_file(processed_image_data, file_extension=file_ext, **processing_params)
+def _process_single_file_for_batch(entry: Dict[str, Any], processing_params: Dict[str, Any], request_id: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Função auxiliar para processar um único arquivo dentro de um lote.
+    
+    Returns:
+        (resultado do arquivo no lote, resposta no formato do /ocr para o cache ou None)
+    """
+    file_start_time = time.time()
+    index, filename, file_ext = entry['file_index'], entry['filename'], entry['file_ext']
+    try:
+        image_array = entry.pop('image_array', None)  # Liberar o array assim que o arquivo for processado
+        ocr_result = _single_flight(entry['cache_key'], lambda: _run_ocr(entry['file_data'], file_ext, processing_params, request_id=request_id, image_array=image_array))
         
         result = {
             'file_index': index,
-            'filename': file_obj.filename,
+            'filename': filename,
             'success': True,
             'text': ocr_result.get('text', ''),
             'confidence': ocr_result.get('confidence', 0),
             'processing_time_ms': int((time.time() - file_start_time) * 1000)
         }
-        # A extração de dados estruturados foi removida deste serviço.
-        return result
+        response_data = _build_ocr_response(request_id, filename, entry['file_data'], file_ext, entry['file_hash'], ocr_result, processing_params, file_start_time)
+        return result, response_data
+    except Exception as e:
+        logger.error(f"Erro ao processar arquivo {filename} no lote", error=str(e), exc_info=True)
+        return {'file_index': index, 'filename': filename, 'success': False, 'error': str(e), 'processing_time_ms': int((time.time() - file_start_time) * 1000)}, None
+
+def _batch_cache_lookup(cache_keys: List[str]) -> List[Optional[str]]:
+    """Busca todas as chaves do lote em um único MGET (1 round-trip)"""
+    if not redis_client or not cache_keys:
+        return [None] * len(cache_keys)
+    try:
+        return redis_client.mget(cache_keys)
+    except Exception as e:
+        logger.warning("Erro ao acessar cache", error=str(e), exc_info=True)
+        return [None] * len(cache_keys)
+
+def _batch_cache_store(items: List[Tuple[str, Dict[str, Any]]]):
+    """Grava os resultados novos do lote com um pipeline de SETEX"""
+    if not redis_client or not items:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for cache_key, response_data in items:
+            pipe.setex(cache_key, config_module.config.CACHE_TTL, json.dumps(response_data, ensure_ascii=False))
+        pipe.execute()
+        logger.info("Resultados do lote salvos no cache", count=len(items))
     except Exception as e:
-        logger.error(f"Erro ao processar arquivo {file_obj.filename} no lote", error=str(e), exc_info=True)
-        return {'file_index': index, 'filename': file_obj.filename, 'success': False, 'error': str(e), 'processing_time_ms': int((time.time() - file_start_time) * 1000)}
+        logger.warning("Erro ao salvar no cache", error=str(e), exc_info=True)
 
 @app.route('/batch', methods=['POST']) 
 def process_batch():
     """Processamento em lote de múltiplos arquivos"""
     start_time = time.time()
-    request_id = hashlib.md5(f"batch_{time.time()}".encode()).hexdigest()[:8]
+    request_id = 'b' + token_hex(4)
     auth_header_present = bool(request.headers.get('Authorization'))
     logger.info("Iniciando processamento em lote", request_id=request_id, auth_header_present=auth_header_present)
     
@@ -440,11 +612,59 @@ def process_batch():
             'use_gpu': request.form.get('use_gpu', str(config_module.config.ENABLE_GPU)).lower() == 'true',
             'confidence_threshold': float(request.form.get('confidence_threshold', config_module.config.CONFIDENCE_THRESHOLD)),
             'extract_tables': request.form.get('extract_tables', 'true').lower() == 'true', # Manter, pode ser útil
-            'extract_layout': request.form.get('extract_layout', 'true').lower() == 'true' # Manter
+            'extract_layout': request.form.get('extract_layout', 'true').lower() == 'true', # Manter
+            'high_quality': request.form.get('high_quality', 'false').lower() == 'true'  # PDFs renderizados na DPI máxima
             # 'medical_parsing' foi removido
         }
 
-        results = [_process_single_file_for_batch(f, i, processing_params) for i, f in enumerate(files)]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        entries = []
+        for i, f in enumerate(files):
+            error_result, entry = _load_file_for_batch(f, i, processing_params)
+            if error_result is not None:
+                results[i] = error_result
+            else:
+                entries.append(entry)
+
+        # Consultar o cache de todo o lote de uma vez; OCR apenas para os misses
+        cached_values = _batch_cache_lookup([e['cache_key'] for e in entries])
+        
+        # Pré-processar as imagens dos misses em paralelo antes do OCR sequencial
+        to_preprocess = [e for e, cached in zip(entries, cached_values) if not cached and e['file_ext'] in PREPROCESS_EXTENSIONS]
+        if len(to_preprocess) > 1:
+            try:
+                preproc_start = time.time()
+                arrays = get_image_processor().preprocess_batch([e['file_data'] for e in to_preprocess])
+                for entry, image_array in zip(to_preprocess, arrays):
+                    if image_array is not None:
+                        entry['image_array'] = image_array
+                logger.info("Imagens do lote pré-processadas", request_id=request_id, count=len(to_preprocess),
+                            preproc_ms=int((time.time() - preproc_start) * 1000))
+            except Exception as e:
+                # Sem image_array, cada arquivo segue pelo pré-processamento (e tratamento de erro) de _run_ocr
+                logger.warning("Erro no pré-processamento do lote, processando arquivo a arquivo",
+                               error=str(e), request_id=request_id)
+        to_cache = []
+        for entry, cached_result_str in zip(entries, cached_values):
+            index = entry['file_index']
+            if cached_result_str:
+                cached_result = json.loads(cached_result_str)
+                results[index] = {
+                    'file_index': index,
+                    'filename': entry['filename'],
+                    'success': True,
+                    'text': cached_result.get('text', ''),
+                    'confidence': cached_result.get('confidence', 0),
+                    'processing_time_ms': 0,
+                    'cached': True
+                }
+                continue
+
+            results[index], response_data = _process_single_file_for_batch(entry, processing_params, request_id)
+            if response_data and response_data['confidence'] > 0.5:
+                to_cache.append((entry['cache_key'], response_data))
+
+        _batch_cache_store(to_cache)
         
         successful_count = sum(1 for r in results if r.get('success'))
         failed_count = len(results) - successful_count
@@ -457,6 +677,8 @@ def process_batch():
             'total_processing_time_ms': int((time.time() - start_time) * 1000)
         }
         return jsonify(response)
+    except RequestEntityTooLarge:
+        raise  # Tratado pelo errorhandler(413)
     except Exception as e:
         logger.error("Erro crítico no processamento em lote", error=str(e), trace=traceback.format_exc(), exc_info=True)
         return jsonify({'success': False, 'error': 'Erro interno no processamento em lote', 'message': str(e), 'request_id': request_id}), 500
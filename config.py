@@ -2,180 +2,423 @@
 Configurações do serviço PaddleOCR
 """
 import os
-from typing import Optional, List, Dict # Adicionado List e Dict para type hinting
-from dataclasses import dataclass, field # Adicionado field
+import re
+import sys
+import logging
+from typing import Any, Optional, Mapping, Iterator
+from dataclasses import dataclass, replace
+from functools import cached_property
+from types import MappingProxyType
 
-@dataclass
+# Logger stdlib: antes do structlog ser configurado (api_server importa este módulo
+# primeiro); sem handlers próprios, avisos vão para stderr pelo handler padrão
+_log = logging.getLogger('config')
+
+# Snapshot do ambiente na importação: uma única cópia de os.environ, estável durante a execução
+_ENV: dict[str, str] = dict(os.environ)
+
+def _e(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Lê uma variável do snapshot do ambiente"""
+    return _ENV.get(key, default)
+
+# Categorias de parâmetros médicos (fonte única para MEDICAL_CATEGORIES e TERM_TO_CATEGORY)
+MEDICAL_CATEGORIES_RAW: dict[str, tuple[str, ...]] = {
+    'hematologia': (
+        'hemoglobina', 'hematócrito', 'leucócitos', 'neutrófilos', 
+        'linfócitos', 'monócitos', 'eosinófilos', 'basófilos', 
+        'plaquetas', 'vhs', 'pcr'
+    ),
+    'bioquímica': (
+        'glicose', 'glicemia', 'colesterol total', 'hdl', 'ldl', 
+        'triglicerídeos', 'ácido úrico', 'proteínas totais', 
+        'albumina', 'globulinas'
+    ),
+    'função_renal': (
+        'creatinina', 'ureia', 'ácido úrico', 'clearance', 
+        'tfg', 'microalbuminúria'
+    ),
+    'função_hepática': (
+        'alt', 'ast', 'ggt', 'fosfatase alcalina', 'bilirrubina total',
+        'bilirrubina direta', 'bilirrubina indireta'
+    ),
+    'hormonal': (
+        'tsh', 't3', 't4', 't4 livre', 'cortisol', 'insulina',
+        'testosterona', 'estradiol', 'progesterona', 'prolactina'
+    ),
+    'eletrólitos': (
+        'sódio', 'potássio', 'cloro', 'cálcio', 'magnésio', 
+        'fósforo', 'ferro', 'ferritina'
+    ),
+    'vitaminas': (
+        'vitamina d', 'vitamina b12', 'ácido fólico', 'vitamina a',
+        'vitamina e', 'vitamina c'
+    )
+}
+
+def _build_term_to_category(categories: dict[str, tuple[str, ...]]) -> dict[str, str]:
+    """Constrói o índice invertido termo -> categoria"""
+    term_to_category = {}
+    for category, terms in categories.items():
+        for term in terms:
+            term_to_category.setdefault(sys.intern(term), sys.intern(category))
+    return term_to_category
+
+def _intern_keys(mapping: dict[str, Any]) -> Mapping[str, Any]:
+    """Interna as chaves (nomes de parâmetros com acento não são internados pelo compilador),
+    para que dicionários que compartilham nomes usem os mesmos objetos str.
+    Retorna uma visão somente leitura: os dados são compartilhados pelo processo inteiro."""
+    return MappingProxyType({sys.intern(key): value for key, value in mapping.items()})
+
+class _MedicalData:
+    """Dados médicos (categorias, faixas de referência, padrões) carregados sob demanda.
+    
+    Requisições que não fazem extração médica (ex.: /health, OCR puro) nunca
+    constroem estes dicionários nem compilam as regex.
+    """
+    
+    @cached_property
+    def medical_categories(self) -> Mapping[str, frozenset]:
+        return MappingProxyType({
+            sys.intern(category): frozenset(sys.intern(term) for term in terms)
+            for category, terms in MEDICAL_CATEGORIES_RAW.items()
+        })
+    
+    @cached_property
+    def term_to_category(self) -> Mapping[str, str]:
+        return MappingProxyType(_build_term_to_category(MEDICAL_CATEGORIES_RAW))
+    
+    @cached_property
+    def reference_ranges(self) -> Mapping[str, dict[str, Any]]:
+        # Reference Ranges (valores de referência padrão)
+        return _intern_keys({
+            'hemoglobina': {'min': 12.0, 'max': 16.0, 'unit': 'g/dL'},
+            'hematócrito': {'min': 36.0, 'max': 48.0, 'unit': '%'},
+            'leucócitos': {'min': 4000, 'max': 11000, 'unit': '/mm³'},
+            'plaquetas': {'min': 150000, 'max': 450000, 'unit': '/mm³'},
+            'glicose': {'min': 70, 'max': 99, 'unit': 'mg/dL'},
+            'colesterol total': {'min': 0, 'max': 200, 'unit': 'mg/dL'},
+            'hdl': {'min': 40, 'max': 999, 'unit': 'mg/dL'},
+            'ldl': {'min': 0, 'max': 130, 'unit': 'mg/dL'},
+            'triglicerídeos': {'min': 0, 'max': 150, 'unit': 'mg/dL'},
+            'creatinina': {'min': 0.6, 'max': 1.2, 'unit': 'mg/dL'},
+            'ureia': {'min': 15, 'max': 45, 'unit': 'mg/dL'},
+            'tsh': {'min': 0.4, 'max': 4.0, 'unit': 'mUI/L'},
+            'alt': {'min': 0, 'max': 41, 'unit': 'U/L'},
+            'ast': {'min': 0, 'max': 40, 'unit': 'U/L'},
+        })
+    
+    @cached_property
+    def parameter_patterns(self) -> Mapping[str, list[str]]:
+        # Text Patterns for Parameter Extraction
+        return _intern_keys({
+            'hemoglobina': [
+                r'(?:hemoglobina|hb)\s*:?\s*(\d+[,.]?\d*)\s*(?:g\/dl|mg\/dl)?'
+            ],
+            'hematócrito': [
+                r'(?:hematócrito|ht|hct)\s*:?\s*(\d+[,.]?\d*)\s*%?'
+            ],
+            'leucócitos': [
+                r'(?:leucócitos|glóbulos brancos|wbc)\s*:?\s*(\d+[,.]?\d*)\s*(?:\/mm³|mil\/mm³|k\/ul)?'
+            ],
+            'plaquetas': [
+                r'(?:plaquetas|plt)\s*:?\s*(\d+[,.]?\d*)\s*(?:\/mm³|mil\/mm³|k\/ul)?'
+            ],
+            'glicose': [
+                r'(?:glicose|glicemia|glucose)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'colesterol_total': [
+                r'(?:colesterol total|col total)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'hdl': [
+                r'(?:hdl|hdl-c)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'ldl': [
+                r'(?:ldl|ldl-c)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'triglicerídeos': [
+                r'(?:triglicerídeos|triglicerides|tg)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'creatinina': [
+                r'(?:creatinina|creat)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'ureia': [
+                r'(?:ureia|uréia|bun)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?'
+            ],
+            'tsh': [
+                r'(?:tsh)\s*:?\s*(\d+[,.]?\d*)\s*(?:mui\/l|miu\/ml)?'
+            ]
+        })
+    
+    @cached_property
+    def compiled_patterns(self) -> dict[str, list[re.Pattern]]:
+        return {
+            param_name: [re.compile(pattern, re.IGNORECASE | re.UNICODE) for pattern in patterns]
+            for param_name, patterns in self.parameter_patterns.items()
+        }
+    
+    @cached_property
+    def parameter_union(self) -> tuple[re.Pattern, dict[str, tuple[str, int, int]]]:
+        # Todos os parâmetros em uma só regex: uma única passada pelo texto com finditer,
+        # identificando o parâmetro por match.lastgroup
+        return _build_parameter_union(self.parameter_patterns)
+    
+    @cached_property
+    def keyword_automaton(self):
+        return _build_keyword_automaton(self.parameter_patterns)
+
+_MEDICAL_DATA = _MedicalData()
+
+@dataclass(frozen=True)
 class Config:
-    """Configurações principais do serviço"""
+    """Configurações principais do serviço (imutável; use dataclasses.replace para derivar)"""
     
     # API Configuration
-    API_KEY: str = os.getenv('PADDLEOCR_API_KEY', os.getenv('API_KEY', 'paddleocr-key-2024'))
-    HOST: str = os.getenv('HOST', '0.0.0.0')
-    PORT: int = int(os.getenv('PORT', '8000')) # Ajustado para 8000 para corresponder ao Dockerfile
-    DEBUG: bool = os.getenv('DEBUG', 'false').lower() == 'true'
-    WORKERS: int = int(os.getenv('WORKERS', '2'))
+    API_KEY: str = _e('PADDLEOCR_API_KEY', _e('API_KEY', 'paddleocr-key-2024'))
+    HOST: str = _e('HOST', '0.0.0.0')
+    PORT: int = int(_e('PORT', '8000')) # Ajustado para 8000 para corresponder ao Dockerfile
+    DEBUG: bool = _e('DEBUG', 'false').lower() == 'true'
+    WORKERS: int = int(_e('WORKERS', '2'))
     
     # Redis Configuration
-    REDIS_URL: str = os.getenv('REDIS_URL', 'redis://localhost:6379')
-    REDIS_DB: int = int(os.getenv('REDIS_DB', '0'))
-    CACHE_TTL: int = int(os.getenv('CACHE_TTL', '3600'))  # 1 hora
+    REDIS_URL: str = _e('REDIS_URL', 'redis://localhost:6379')
+    REDIS_DB: int = int(_e('REDIS_DB', '0'))
+    CACHE_TTL: int = int(_e('CACHE_TTL', '3600'))  # 1 hora
+    # Cache em memória do processo para resultados de process_file (reenvios sem Redis)
+    RESULT_CACHE_SIZE: int = int(_e('RESULT_CACHE_SIZE', '128'))  # 0 desativa
+    RESULT_CACHE_TTL: int = int(_e('RESULT_CACHE_TTL', '600'))  # 10 minutos
+    REDIS_MAX_CONNECTIONS: int = int(_e('REDIS_MAX_CONNECTIONS', '64'))
     
     # PaddleOCR Configuration
-    PADDLE_OCR_LANG: str = os.getenv('PADDLE_OCR_LANG', 'pt')
-    ENABLE_GPU: bool = os.getenv('ENABLE_GPU', 'false').lower() == 'true'
-    USE_ANGLE_CLS: bool = os.getenv('USE_ANGLE_CLS', 'true').lower() == 'true'
-    USE_SPACE_CHAR: bool = os.getenv('USE_SPACE_CHAR', 'true').lower() == 'true'
+    PADDLE_OCR_LANG: str = _e('PADDLE_OCR_LANG', 'pt')
+    ENABLE_GPU: bool = _e('ENABLE_GPU', 'false').lower() == 'true'
+    USE_ANGLE_CLS: bool = _e('USE_ANGLE_CLS', 'true').lower() == 'true'
+    USE_SPACE_CHAR: bool = _e('USE_SPACE_CHAR', 'true').lower() == 'true'
+    
+    # Aceleração da inferência (backend escolhido em MedicalOCRProcessor._acceleration_kwargs)
+    ENABLE_HPI: bool = _e('ENABLE_HPI', 'true').lower() == 'true'
+    HPI_BACKEND: str = _e('HPI_BACKEND', 'auto').lower()  # auto | paddle | mkldnn | tensorrt
+    HPI_PRECISION: str = _e('HPI_PRECISION', '').lower()  # vazio = automático | fp32 | fp16 (GPU) | bf16 (CPU) | int8
+    CPU_THREADS: int = int(_e('CPU_THREADS', '0'))  # 0 = padrão do PaddleOCR
+    # Conjuntos de engines independentes na CPU (páginas de PDF em paralelo); cada
+    # réplica custa a memória de mais um conjunto de modelos. Ignorado na GPU
+    OCR_ENGINE_POOL_SIZE: int = int(_e('OCR_ENGINE_POOL_SIZE', '1'))
+    # Linhas de texto reconhecidas por lote no modelo rec (0 = 8 na GPU, 1 na CPU)
+    REC_BATCH_NUM: int = int(_e('REC_BATCH_NUM', '0'))
+    # Modelos + shapes dinâmicos do TensorRT, separados por GPU (SM) e precisão
+    TRT_CACHE_DIR: str = _e('TRT_CACHE_DIR', os.path.expanduser('~/.cache/medocr/trt'))
+    # INT8 na CPU (só com o backend MKLDNN): modelos det/rec quantizados (PTQ) no
+    # primeiro start, calibrados com imagens de exames de QUANT_CALIBRATION_DIR;
+    # sem elas, segue em FP32
+    QUANT_CACHE_DIR: str = _e('QUANT_CACHE_DIR', os.path.expanduser('~/.cache/medocr/quant'))
+    QUANT_CALIBRATION_DIR: str = _e('QUANT_CALIBRATION_DIR', '')
+    QUANT_CALIBRATION_SAMPLES: int = int(_e('QUANT_CALIBRATION_SAMPLES', '32'))
+    # Recriar os engines após N arquivos ou acima de um RSS (0 desativa). Sob o
+    # Gunicorn a reciclagem de workers (MAX_REQUESTS / MAX_WORKER_RSS_MB, sobre a
+    # memória privada do worker) já cobre isso; útil ao rodar o servidor Flask diretamente
+    OCR_RECYCLE_INTERVAL: int = int(_e('OCR_RECYCLE_INTERVAL', '0'))
+    OCR_MAX_RSS_MB: int = int(_e('OCR_MAX_RSS_MB', '0'))
+    # Inferência de aquecimento ao criar os engines (absorve o custo da 1ª chamada)
+    OCR_WARMUP: bool = _e('OCR_WARMUP', 'true').lower() == 'true'
     
     # File Processing
-    MAX_FILE_SIZE: int = int(os.getenv('MAX_FILE_SIZE', '10485760'))  # 10MB
-    ALLOWED_EXTENSIONS: List[str] = field(default_factory=lambda: ['jpg', 'jpeg', 'png', 'pdf', 'bmp', 'tiff'])
-    TEMP_DIR: str = os.getenv('TEMP_DIR', './temp')
-    UPLOAD_DIR: str = os.getenv('UPLOAD_DIR', './uploads')
+    MAX_FILE_SIZE: int = int(_e('MAX_FILE_SIZE', '10485760'))  # 10MB
+    ALLOWED_EXTENSIONS: frozenset = frozenset({'jpg', 'jpeg', 'png', 'pdf', 'bmp', 'tiff'})
+    TEMP_DIR: str = _e('TEMP_DIR', './temp')
+    UPLOAD_DIR: str = _e('UPLOAD_DIR', './uploads')
     
     # Logging
-    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE: str = os.getenv('LOG_FILE', './logs/paddleocr.log')
-    LOG_MAX_SIZE: int = int(os.getenv('LOG_MAX_SIZE', '10485760'))  # 10MB
-    LOG_BACKUP_COUNT: int = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    LOG_LEVEL: str = _e('LOG_LEVEL', 'INFO')
+    LOG_FILE: str = _e('LOG_FILE', './logs/paddleocr.log')
+    LOG_MAX_SIZE: int = int(_e('LOG_MAX_SIZE', '10485760'))  # 10MB
+    LOG_BACKUP_COUNT: int = int(_e('LOG_BACKUP_COUNT', '5'))
     
     # Processing Configuration
-    CONFIDENCE_THRESHOLD: float = float(os.getenv('CONFIDENCE_THRESHOLD', '0.7'))
-    MIN_TEXT_LENGTH: int = int(os.getenv('MIN_TEXT_LENGTH', '3'))
-    MAX_PROCESSING_TIME: int = int(os.getenv('MAX_PROCESSING_TIME', '300'))  # 5 minutos
-    BATCH_MAX_FILES: int = int(os.getenv('BATCH_MAX_FILES', '10'))  # Máximo de arquivos por lote
-    
-    # Medical Parameters Configuration
-    MEDICAL_CATEGORIES: Dict[str, List[str]] = field(default_factory=lambda: {
-        'hematologia': [
-            'hemoglobina', 'hematócrito', 'leucócitos', 'neutrófilos', 
-            'linfócitos', 'monócitos', 'eosinófilos', 'basófilos', 
-            'plaquetas', 'vhs', 'pcr'
-        ],
-        'bioquímica': [
-            'glicose', 'glicemia', 'colesterol total', 'hdl', 'ldl', 
-            'triglicerídeos', 'ácido úrico', 'proteínas totais', 
-            'albumina', 'globulinas'
-        ],
-        'função_renal': [
-            'creatinina', 'ureia', 'ácido úrico', 'clearance', 
-            'tfg', 'microalbuminúria'
-        ],
-        'função_hepática': [
-            'alt', 'ast', 'ggt', 'fosfatase alcalina', 'bilirrubina total',
-            'bilirrubina direta', 'bilirrubina indireta'
-        ],
-        'hormonal': [
-            'tsh', 't3', 't4', 't4 livre', 'cortisol', 'insulina',
-            'testosterona', 'estradiol', 'progesterona', 'prolactina'
-        ],
-        'eletrólitos': [
-            'sódio', 'potássio', 'cloro', 'cálcio', 'magnésio', 
-            'fósforo', 'ferro', 'ferritina'
-        ],
-        'vitaminas': [
-            'vitamina d', 'vitamina b12', 'ácido fólico', 'vitamina a',
-            'vitamina e', 'vitamina c'
-        ]
-    })
+    CONFIDENCE_THRESHOLD: float = float(_e('CONFIDENCE_THRESHOLD', '0.7'))
+    MIN_TEXT_LENGTH: int = int(_e('MIN_TEXT_LENGTH', '3'))
+    MAX_PROCESSING_TIME: int = int(_e('MAX_PROCESSING_TIME', '300'))  # 5 minutos
+    BATCH_MAX_FILES: int = int(_e('BATCH_MAX_FILES', '10'))  # Máximo de arquivos por lote
+    PDF_PREFETCH_PAGES: int = int(_e('PDF_PREFETCH_PAGES', '2'))  # Páginas renderizadas à frente do OCR
+    # Renderização de PDF: DPI escolhida para o lado maior chegar a DET_LIMIT_SIDE_LEN
+    # (tamanho de entrada do detector), limitada a [PDF_RENDER_DPI_MIN, PDF_RENDER_DPI_MAX]
+    DET_LIMIT_SIDE_LEN: int = int(_e('DET_LIMIT_SIDE_LEN', '960'))
+    PDF_RENDER_DPI_MIN: int = int(_e('PDF_RENDER_DPI_MIN', '150'))
+    PDF_RENDER_DPI_MAX: int = int(_e('PDF_RENDER_DPI_MAX', '300'))
+    # Filtros aplicados dentro do PaddleOCR (padrões iguais aos do PaddleOCR 2.7):
+    # caixas do detector abaixo de DET_DB_BOX_THRESH nem chegam ao reconhecedor, e
+    # linhas reconhecidas abaixo de OCR_DROP_SCORE não são devolvidas
+    DET_DB_BOX_THRESH: float = float(_e('DET_DB_BOX_THRESH', '0.6'))
+    OCR_DROP_SCORE: float = float(_e('OCR_DROP_SCORE', '0.5'))
     
     # Unidades conhecidas
-    KNOWN_UNITS: List[str] = field(default_factory=lambda: [
+    KNOWN_UNITS: tuple[str, ...] = (
         'g/dL', '%', '/mm³', 'mg/dL', 'mUI/L', 'ng/mL', 'pg/mL', 'UI/L', 'U/L', 'mL/min/1.73m2', 'mEq/L'
-    ])
-
-    # Reference Ranges (valores de referência padrão)
-    REFERENCE_RANGES: Dict[str, Dict[str, any]] = field(default_factory=lambda: {
-        'hemoglobina': {'min': 12.0, 'max': 16.0, 'unit': 'g/dL'},
-        'hematócrito': {'min': 36.0, 'max': 48.0, 'unit': '%'},
-        'leucócitos': {'min': 4000, 'max': 11000, 'unit': '/mm³'},
-        'plaquetas': {'min': 150000, 'max': 450000, 'unit': '/mm³'},
-        'glicose': {'min': 70, 'max': 99, 'unit': 'mg/dL'},
-        'colesterol total': {'min': 0, 'max': 200, 'unit': 'mg/dL'},
-        'hdl': {'min': 40, 'max': 999, 'unit': 'mg/dL'},
-        'ldl': {'min': 0, 'max': 130, 'unit': 'mg/dL'},
-        'triglicerídeos': {'min': 0, 'max': 150, 'unit': 'mg/dL'},
-        'creatinina': {'min': 0.6, 'max': 1.2, 'unit': 'mg/dL'},
-        'ureia': {'min': 15, 'max': 45, 'unit': 'mg/dL'},
-        'tsh': {'min': 0.4, 'max': 4.0, 'unit': 'mUI/L'},
-        'alt': {'min': 0, 'max': 41, 'unit': 'U/L'},
-        'ast': {'min': 0, 'max': 40, 'unit': 'U/L'},
-    })
-    
-    # Text Patterns for Parameter Extraction
-    PARAMETER_PATTERNS: Dict[str, List[str]] = field(default_factory=lambda: {
-        'hemoglobina': [
-            r'(?:hemoglobina|hb)\s*:?\s*(\d+[,.]?\d*)\s*(?:g\/dl|mg\/dl)?',
-            r'hb\s*(\d+[,.]?\d*)',
-            r'hemoglobina\s*(\d+[,.]?\d*)'
-        ],
-        'hematócrito': [
-            r'(?:hematócrito|ht|hct)\s*:?\s*(\d+[,.]?\d*)\s*%?',
-            r'ht\s*(\d+[,.]?\d*)',
-            r'hematócrito\s*(\d+[,.]?\d*)'
-        ],
-        'leucócitos': [
-            r'(?:leucócitos|glóbulos brancos|wbc)\s*:?\s*(\d+[,.]?\d*)\s*(?:\/mm³|mil\/mm³|k\/ul)?',
-            r'leucócitos\s*(\d+[,.]?\d*)',
-            r'glóbulos brancos\s*(\d+[,.]?\d*)'
-        ],
-        'plaquetas': [
-            r'(?:plaquetas|plt)\s*:?\s*(\d+[,.]?\d*)\s*(?:\/mm³|mil\/mm³|k\/ul)?',
-            r'plaquetas\s*(\d+[,.]?\d*)',
-            r'plt\s*(\d+[,.]?\d*)'
-        ],
-        'glicose': [
-            r'(?:glicose|glicemia|glucose)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'glicose\s*(\d+[,.]?\d*)',
-            r'glicemia\s*(\d+[,.]?\d*)'
-        ],
-        'colesterol_total': [
-            r'(?:colesterol total|col total)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'colesterol total\s*(\d+[,.]?\d*)',
-            r'col total\s*(\d+[,.]?\d*)'
-        ],
-        'hdl': [
-            r'(?:hdl|hdl-c)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'hdl\s*(\d+[,.]?\d*)',
-            r'hdl-c\s*(\d+[,.]?\d*)'
-        ],
-        'ldl': [
-            r'(?:ldl|ldl-c)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'ldl\s*(\d+[,.]?\d*)',
-            r'ldl-c\s*(\d+[,.]?\d*)'
-        ],
-        'triglicerídeos': [
-            r'(?:triglicerídeos|triglicerides|tg)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'triglicerídeos\s*(\d+[,.]?\d*)',
-            r'triglicerides\s*(\d+[,.]?\d*)'
-        ],
-        'creatinina': [
-            r'(?:creatinina|creat)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'creatinina\s*(\d+[,.]?\d*)',
-            r'creat\s*(\d+[,.]?\d*)'
-        ],
-        'ureia': [
-            r'(?:ureia|uréia|bun)\s*:?\s*(\d+[,.]?\d*)\s*(?:mg\/dl)?',
-            r'ureia\s*(\d+[,.]?\d*)',
-            r'uréia\s*(\d+[,.]?\d*)'
-        ],
-        'tsh': [
-            r'(?:tsh)\s*:?\s*(\d+[,.]?\d*)\s*(?:mui\/l|miu\/ml)?',
-            r'tsh\s*(\d+[,.]?\d*)'
-        ]
-    })
+    )
+
+    # Dados médicos: materializados sob demanda na primeira leitura (ver _MedicalData)
+    @property
+    def MEDICAL_CATEGORIES(self) -> Mapping[str, frozenset]:
+        return _MEDICAL_DATA.medical_categories
+    
+    @property
+    def TERM_TO_CATEGORY(self) -> Mapping[str, str]:
+        """Mapeamento reverso termo -> categoria (a primeira categoria prevalece)"""
+        return _MEDICAL_DATA.term_to_category
+    
+    @property
+    def REFERENCE_RANGES(self) -> Mapping[str, dict[str, Any]]:
+        return _MEDICAL_DATA.reference_ranges
+    
+    @property
+    def PARAMETER_PATTERNS(self) -> Mapping[str, list[str]]:
+        return _MEDICAL_DATA.parameter_patterns
 
 # Instância global de configuração
 config = Config()
 
+def _build_parameter_union(parameter_patterns: Mapping[str, list[str]]) -> tuple[re.Pattern, dict[str, tuple[str, int, int]]]:
+    """Funde todos os PARAMETER_PATTERNS em uma única regex de alternação.
+    
+    Cada parâmetro vira um grupo nomeado p0, p1, ... contendo suas alternativas;
+    cada alternativa tem exatamente um grupo de captura (o valor numérico).
+    
+    Returns:
+        (regex unificada, {nome do grupo: (parâmetro, primeiro e último índice
+        dos grupos de valor dentro dele)})
+    """
+    parts = []
+    groups = {}
+    next_index = 1
+    for i, (param_name, patterns) in enumerate(parameter_patterns.items()):
+        group_name = f'p{i}'
+        first_value_group = next_index + 1
+        value_groups = sum(re.compile(pattern).groups for pattern in patterns)
+        groups[group_name] = (param_name, first_value_group, first_value_group + value_groups - 1)
+        next_index = first_value_group + value_groups
+        parts.append(f'(?P<{group_name}>' + '|'.join(f'(?:{pattern})' for pattern in patterns) + ')')
+    return compile_regex('|'.join(parts), re.IGNORECASE | re.UNICODE), groups
+
+def _load_re2():
+    """Módulo re2 (google-re2) se REGEX_ENGINE=re2 e o pacote estiver instalado; senão None"""
+    if _e('REGEX_ENGINE', 're').lower() != 're2':
+        return None
+    try:
+        import re2
+    except ImportError:
+        _log.warning("REGEX_ENGINE=re2, mas o pacote google-re2 não está instalado. Usando re.")
+        return None
+    return re2
+
+_RE2_UNSET = object()
+_re2_module = _RE2_UNSET
+
+def compile_regex(pattern: str, flags: int = 0):
+    """Compila com RE2 (DFA, tempo linear no texto) quando habilitado; senão com re.
+    
+    Opt-in via REGEX_ENGINE=re2: no RE2, \\s e \\d casam apenas ASCII (no re,
+    qualquer espaço/dígito Unicode, como o NBSP comum em texto de OCR). Só
+    re.IGNORECASE é repassado, como (?i). Padrões que o RE2 não aceita
+    (lookaround, backreference) caem no re.
+    """
+    global _re2_module
+    if _re2_module is _RE2_UNSET:
+        _re2_module = _load_re2()
+    if _re2_module is not None:
+        try:
+            return _re2_module.compile(('(?i)' if flags & re.IGNORECASE else '') + pattern)
+        except Exception as e:
+            _log.warning("Padrão não suportado pelo RE2 (%s). Usando re.", e)
+    return re.compile(pattern, flags)
+
+def _leading_keywords(pattern: str) -> list[str]:
+    """Extrai os literais iniciais de um padrão ('(?:a|b)\\s*...' ou 'a\\s*...')."""
+    if pattern.startswith('(?:'):
+        head = pattern[3:pattern.index(')')]
+        return head.split('|')
+    return [re.split(r'\\', pattern, maxsplit=1)[0]]
+
+def _build_keyword_automaton(parameter_patterns: Mapping[str, list[str]]):
+    """Constrói um autômato Aho–Corasick com os literais iniciais de PARAMETER_PATTERNS.
+    
+    Todo padrão começa por uma palavra-chave literal (hemoglobina, hb, tsh, ...),
+    então as posições dessas palavras são exatamente os inícios candidatos de match.
+    Retorna None se o pyahocorasick (requirements.txt) não estiver instalado.
+    """
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for patterns in parameter_patterns.values():
+        for pattern in patterns:
+            for keyword in _leading_keywords(pattern):
+                keyword = keyword.lower()
+                automaton.add_word(keyword, len(keyword))
+    automaton.make_automaton()
+    return automaton
+
+def _match_at_candidates(text: str, starts: list[int]) -> Iterator[re.Match]:
+    """Executa a regex unificada apenas nas posições candidatas, sem sobreposição."""
+    union_pattern = _MEDICAL_DATA.parameter_union[0]
+    pos = 0
+    for start in starts:
+        if start < pos:
+            continue
+        match = union_pattern.match(text, start)
+        if match:
+            yield match
+            pos = match.end()
+
+def iter_parameter_matches(text: str, text_lower: Optional[str] = None) -> Iterator[re.Match]:
+    """Itera os matches de PARAMETER_UNION_PATTERN no texto (sem sobreposição).
+    
+    O autômato Aho–Corasick de palavras-chave varre o texto uma vez para obter as
+    posições candidatas, e a regex unificada só é executada nessas posições (para
+    extrair os grupos). Sem pyahocorasick, equivale a
+    PARAMETER_UNION_PATTERN.finditer(text).
+    
+    text_lower: text.lower() já calculado pelo chamador, para não repetir a cópia.
+    """
+    keyword_automaton = _MEDICAL_DATA.keyword_automaton
+    if keyword_automaton is not None:
+        lowered = text_lower if text_lower is not None else text.lower()
+        # lower() pode alterar o comprimento de alguns caracteres Unicode
+        if len(lowered) == len(text):
+            starts = sorted({end - length + 1 for end, length in keyword_automaton.iter(lowered)})
+            yield from _match_at_candidates(text, starts)
+            return
+    
+    yield from _MEDICAL_DATA.parameter_union[0].finditer(text)
+
 def get_config() -> Config:
     """Retorna a instância de configuração"""
     return config
 
-# Adicionar esta função no final do config.py
-def validate_config() -> bool:
-    """Valida as configurações"""
-    global config # Precisamos declarar config como global para modificá-la aqui
+def get_compiled_patterns() -> dict[str, list[re.Pattern]]:
+    """Retorna os PARAMETER_PATTERNS já compilados (re.IGNORECASE | re.UNICODE)"""
+    return _MEDICAL_DATA.compiled_patterns
+
+_LAZY_MODULE_ATTRS = {
+    'COMPILED_PARAMETER_PATTERNS': lambda: _MEDICAL_DATA.compiled_patterns,
+    'PARAMETER_UNION_PATTERN': lambda: _MEDICAL_DATA.parameter_union[0],
+    'PARAMETER_UNION_GROUPS': lambda: _MEDICAL_DATA.parameter_union[1],
+    'KEYWORD_AUTOMATON': lambda: _MEDICAL_DATA.keyword_automaton,
+}
+
+def __getattr__(name: str):
+    """Resolve sob demanda os artefatos de regex expostos no nível do módulo (PEP 562)"""
+    if name in _LAZY_MODULE_ATTRS:
+        return _LAZY_MODULE_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _makedirs_if_missing(path: str):
+    """os.makedirs só quando o diretório não existe (caminho comum: um único stat)"""
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+
+def ensure_dirs() -> bool:
+    """Cria os diretórios de trabalho (temp, upload, log), com fallback para /tmp"""
+    global config # Config é imutável: o fallback gera uma nova instância via replace()
     try:
         # Verificar diretórios - com fallback para ambiente/container (Coolify)
         # Usar os diretórios padrão definidos na classe Config inicialmente
@@ -184,44 +427,56 @@ def validate_config() -> bool:
         log_file_to_check = config.LOG_FILE
         
         try:
-            os.makedirs(temp_dir_to_check, exist_ok=True)
-            os.makedirs(upload_dir_to_check, exist_ok=True)
+            _makedirs_if_missing(temp_dir_to_check)
+            _makedirs_if_missing(upload_dir_to_check)
             
             log_dir = os.path.dirname(log_file_to_check)
             if log_dir and log_dir != '.': # Evitar tentar criar '.' se LOG_FILE for apenas um nome de arquivo
-                os.makedirs(log_dir, exist_ok=True)
+                _makedirs_if_missing(log_dir)
                 
         except OSError:
-            # Se não conseguir criar diretórios, usar /tmp e atualizar a instância config
-            print(f"OSError ao criar diretórios. Usando /tmp e atualizando config.")
-            config.TEMP_DIR = '/tmp'
-            config.UPLOAD_DIR = '/tmp'
-            config.LOG_FILE = '/tmp/paddleocr.log'
-            # Tentar criar /tmp (geralmente já existe e é gravável)
-            os.makedirs(config.TEMP_DIR, exist_ok=True)
-            os.makedirs(config.UPLOAD_DIR, exist_ok=True)
-            # Não precisamos criar o diretório para /tmp/paddleocr.log pois /tmp já existe
+            # Se não conseguir criar diretórios, usar /tmp
+            _log.warning("OSError ao criar diretórios. Usando /tmp e atualizando config.")
+            config = replace(config, TEMP_DIR='/tmp', UPLOAD_DIR='/tmp', LOG_FILE='/tmp/paddleocr.log')
+            # /tmp geralmente já existe e é gravável
+            _makedirs_if_missing('/tmp')
+        
+        return True
+        
+    except Exception as e:
+        _log.error("Erro ao preparar diretórios: %s", e)
+        return False
+
+def validate_config() -> bool:
+    """Valida as configurações"""
+    global config # Config é imutável: correções geram uma nova instância via replace()
+    try:
+        overrides = {}
         
         # Verificar valores críticos
         if config.MAX_FILE_SIZE <= 0:
-            print(f"MAX_FILE_SIZE inválido ({config.MAX_FILE_SIZE}). Resetando para 10MB.")
-            config.MAX_FILE_SIZE = 10485760  # 10MB default
+            _log.warning("MAX_FILE_SIZE inválido (%s). Resetando para 10MB.", config.MAX_FILE_SIZE)
+            overrides['MAX_FILE_SIZE'] = 10485760  # 10MB default
         
         if not (0 <= config.CONFIDENCE_THRESHOLD <= 1):
-            print(f"CONFIDENCE_THRESHOLD inválido ({config.CONFIDENCE_THRESHOLD}). Resetando para 0.7.")
-            config.CONFIDENCE_THRESHOLD = 0.7  # Default
+            _log.warning("CONFIDENCE_THRESHOLD inválido (%s). Resetando para 0.7.", config.CONFIDENCE_THRESHOLD)
+            overrides['CONFIDENCE_THRESHOLD'] = 0.7  # Default
+        
+        if overrides:
+            config = replace(config, **overrides)
         
         return True
         
     except Exception as e:
-        print(f"Erro na validação da configuração: {e}")
+        _log.error("Erro na validação da configuração: %s", e)
         return False
 
-# Validar configuração na importação
+# Validar configuração na importação (sem I/O; os diretórios são criados por
+# ensure_dirs() no hook on_starting do Gunicorn)
 if not validate_config():
     # Considerar se realmente queremos um RuntimeError aqui,
     # pois pode impedir o início do app se a validação falhar por permissões,
     # mesmo que tenhamos fallbacks.
-    # Por agora, vamos apenas logar o erro se validate_config já imprime.
-    print("AVISO: Validação da configuração encontrou problemas. A aplicação pode não funcionar como esperado.")
+    # Por agora, vamos apenas logar o erro se validate_config já registrou o problema.
+    _log.warning("Validação da configuração encontrou problemas. A aplicação pode não funcionar como esperado.")
     # raise RuntimeError("Configuração inválida")
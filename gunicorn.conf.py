@@ -4,6 +4,7 @@ Focada em performance e estabilidade para processamento de OCR
 """
 
 import os
+import sys
 import multiprocessing
 
 # Configurações de bind
@@ -12,11 +13,25 @@ bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
 # Workers - usar apenas 1 worker para evitar problemas de memória com PaddleOCR
 workers = int(os.getenv('WORKERS', '1'))
 
-# Tipo de worker - sync é melhor para processamento pesado de OCR
-worker_class = "sync"
+# Tipo de worker - gthread: threads sobrepõem upload, pré-processamento e
+# serialização da resposta com a inferência do PaddleOCR (que libera a GIL no
+# código nativo e é serializada por um lock no MedicalOCRProcessor)
+# WORKER_CLASS=sync volta ao modelo de uma requisição por worker
+# WORKER_CLASS=gevent permite muitas conexões ociosas por worker (requer o
+# pacote gevent instalado), mas a inferência do PaddleOCR é CPU-bound e bloqueia
+# o loop de greenlets enquanto roda
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('THREADS', '4'))  # Só para gthread
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', '1000'))  # Limite de conexões (gthread/gevent/eventlet)
 
 # Timeout - 120s é suficiente para OCR de imagens (sem PP-Structure: ~10-30s)
-# PDFs grandes podem demorar mais, mas 120s evita workers travados indefinidamente
+# ATENÇÃO: o significado depende do worker_class. Com sync, o worker que passa
+# 120s sem responder ao master é morto, então uma requisição travada nunca passa
+# disso. Com gthread (padrão) o heartbeat é enviado pelo loop principal do worker,
+# que continua vivo enquanto uma thread está presa no OCR: o timeout só detecta o
+# worker inteiro travado, não uma requisição. Requisições lentas ou travadas não
+# são interrompidas (a inferência do Paddle não é cancelável); quem precisar do
+# limite por requisição deve usar WORKER_CLASS=sync ou um timeout no proxy reverso
 timeout = int(os.getenv('TIMEOUT', '120'))
 keepalive = 5
 
@@ -25,11 +40,22 @@ preload_app = True
 
 # Reciclagem de workers para evitar vazamentos de memória
 max_requests = int(os.getenv('MAX_REQUESTS', '1000'))
-max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '100'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '200'))
+# Reciclar também quando a memória privada do worker (crescimento desde o fork, sem
+# as páginas dos modelos compartilhadas com o master via preload_app) passar deste
+# limite (0 desativa)
+max_worker_rss_mb = int(os.getenv('MAX_WORKER_RSS_MB', '2048'))
 
 # Configurações de memória
 worker_tmp_dir = "/dev/shm"  # Usar RAM para arquivos temporários (se disponível)
 
+# Afinidade de CPU por worker (opt-in; útil com WORKERS > 1 em hosts multi-socket)
+pin_workers = os.getenv('PIN_WORKERS', 'false').lower() == 'true'
+
+# Travar em RAM (mlock) a memória do master com os modelos já carregados (opt-in;
+# requer RLIMIT_MEMLOCK suficiente ou CAP_IPC_LOCK no container)
+lock_model_memory = os.getenv('LOCK_MODEL_MEMORY', 'false').lower() == 'true'
+
 # Logging
 loglevel = os.getenv('LOG_LEVEL', 'info').lower()
 accesslog = "-"  # stdout
@@ -45,10 +71,47 @@ tmp_upload_dir = None
 def on_starting(server):
     """Hook executado quando o servidor está iniciando"""
     server.log.info("🚀 Iniciando servidor PaddleOCR otimizado")
+    # Criar diretórios de trabalho uma única vez, no master, antes dos forks
+    import config
+    if not config.ensure_dirs():
+        server.log.warning("⚠️ Não foi possível preparar os diretórios de trabalho")
 
 def when_ready(server):
     """Hook executado quando o servidor está pronto"""
     server.log.info("✅ Servidor PaddleOCR pronto para receber requisições")
+    if lock_model_memory:
+        _lock_master_memory(server)
+
+def _lock_master_memory(server):
+    """mlockall(MCL_CURRENT) no master, depois do aquecimento e antes dos forks.
+    
+    Travas de memória não são herdadas no fork, mas as páginas travadas no master
+    continuam residentes e são as mesmas que os workers compartilham via COW.
+    Travar nos workers forçaria a cópia das páginas privadas e desfaria o
+    compartilhamento.
+    """
+    import ctypes
+    import ctypes.util
+    import resource
+    
+    api_server = sys.modules.get('api_server')
+    if api_server is not None:
+        api_server.wait_for_warmup()
+    
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        if soft != hard:
+            resource.setrlimit(resource.RLIMIT_MEMLOCK, (hard, hard))
+    except (ValueError, OSError):
+        pass
+    
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    MCL_CURRENT = 1
+    if libc.mlockall(MCL_CURRENT) != 0:
+        errno = ctypes.get_errno()
+        server.log.warning(f"⚠️ mlockall falhou ({os.strerror(errno)}); modelos podem ser paginados")
+    else:
+        server.log.info("🔒 Memória dos modelos travada em RAM no master")
 
 def worker_int(worker):
     """Hook executado quando um worker recebe SIGINT"""
@@ -57,10 +120,69 @@ def worker_int(worker):
 def pre_fork(server, worker):
     """Hook executado antes de fazer fork de um worker"""
     server.log.info(f"🔧 Preparando worker {worker.pid}")
+    if pin_workers:
+        # No master, que conhece os workers vivos: worker.age é um contador global
+        # de forks e não identifica a fatia de quem foi reciclado
+        worker.cpu_slot = _free_cpu_slot(server)
+    # Com preload_app o master já importou api_server e disparou o aquecimento
+    # em uma thread; aguardar aqui para os workers herdarem os modelos prontos
+    # (threads não sobrevivem ao fork e um lock preso travaria o worker)
+    api_server = sys.modules.get('api_server')
+    if api_server is not None and not api_server.wait_for_warmup():
+        server.log.warning("⚠️ Modelos não pré-carregados; workers inicializarão sob demanda")
 
 def post_fork(server, worker):
     """Hook executado após fazer fork de um worker"""
     server.log.info(f"🎯 Worker {worker.pid} iniciado")
+    if max_worker_rss_mb > 0:
+        # Referência para o limite de memória quando smaps_rollup não existe: o RSS
+        # logo após o fork já inclui os modelos compartilhados com o master
+        from utils.process_memory import current_rss_mb
+        worker.rss_at_fork_mb = current_rss_mb()
+    if pin_workers:
+        _pin_worker_cpus(server, worker)
+
+def _free_cpu_slot(server) -> int:
+    """Menor fatia de CPUs que nenhum worker vivo ocupa (o substituto herda a do reciclado)"""
+    taken = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+    slot = 0
+    while slot in taken:
+        slot += 1
+    return slot
+
+def _pin_worker_cpus(server, worker):
+    """Fixa o worker em uma fatia disjunta das CPUs disponíveis.
+    
+    Cada worker fica com len(cpus) // workers núcleos (e não um só), para que
+    as threads OpenMP/MKL do Paddle continuem paralelas dentro da fatia. A fatia
+    é escolhida no pre_fork (worker.cpu_slot).
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    slots = max(1, server.num_workers)
+    per_worker = max(1, len(cpus) // slots)
+    slot = getattr(worker, 'cpu_slot', 0) % slots
+    chosen = cpus[slot * per_worker:(slot + 1) * per_worker] or cpus
+    try:
+        os.sched_setaffinity(0, chosen)
+        server.log.info(f"📌 Worker {worker.pid} fixado nas CPUs {chosen}")
+    except OSError as e:
+        server.log.warning(f"⚠️ Não foi possível fixar CPUs do worker {worker.pid}: {e}")
+
+def post_request(worker, req, environ, resp):
+    """Hook executado após cada requisição: recicla o worker se a memória própria passou do limite"""
+    if max_worker_rss_mb <= 0:
+        return
+    # Import tardio: o diretório da aplicação só está no sys.path após carregá-la
+    from utils.process_memory import current_rss_mb, private_memory_mb
+    own_mb = private_memory_mb()
+    if own_mb is None:
+        own_mb = current_rss_mb() - getattr(worker, 'rss_at_fork_mb', 0.0)
+    if own_mb > max_worker_rss_mb and worker.alive:
+        worker.log.warning(f"♻️ Worker {worker.pid} com {own_mb:.0f}MB de memória própria (limite {max_worker_rss_mb}MB); reciclando")
+        # Termina as requisições em andamento e sai; o master cria um substituto
+        worker.alive = False
 
 def post_worker_init(worker):
     """Hook executado após inicialização do worker"""
@@ -4,15 +4,20 @@ Integração com PaddleOCR 2.7+ e PP-Structure
 """
 
 import os
-import io
+import gc
 import time
+import hashlib
 import tempfile
-from typing import Dict, Any, List, Optional, Union
+import threading
+import queue
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections.abc import Sequence
+from typing import Dict, Any, List, Optional, Union, Iterable, Iterator, BinaryIO
 import numpy as np
-from PIL import Image
 import cv2
 import fitz  # PyMuPDF
-from pdf2image import convert_from_bytes
 
 try:
     from paddleocr import PaddleOCR, draw_ocr
@@ -22,11 +27,100 @@ except ImportError:
     print("PaddleOCR não disponível. Instale com: pip install paddleocr")
 
 import config as config_module # Alterado para importar o módulo inteiro
+from utils import model_quantization
+from utils.process_memory import current_rss_mb
 import structlog
 
 logger = structlog.get_logger()
 # config = get_config() # Esta linha não é mais necessária
 
+
+class WordList(Sequence):
+    """Lista preguiçosa de palavras do OCR
+    
+    Guarda as linhas reconhecidas em colunas paralelas (texto, confiança, bbox);
+    os dicts por palavra só são montados no primeiro acesso. A API não expõe
+    'words', então na maior parte das requisições nenhum dict é alocado, e cada
+    linha custa três referências em vez de uma tupla.
+    """
+    
+    __slots__ = ('_texts', '_confidences', '_bboxes', '_words')
+    
+    def __init__(self):
+        self._texts: List[str] = []
+        self._confidences: List[float] = []
+        self._bboxes: List[Any] = []
+        self._words = None
+    
+    def add_line(self, text: str, confidence: float, bbox: Any):
+        self._texts.append(text)
+        self._confidences.append(confidence)
+        self._bboxes.append(bbox)
+        self._words = None
+    
+    def tolist(self) -> List[Dict[str, Any]]:
+        if self._words is None:
+            self._words = [
+                {'text': word, 'confidence': confidence, 'bbox': bbox}
+                for text, confidence, bbox in zip(self._texts, self._confidences, self._bboxes)
+                for word in text.split()
+            ]
+        return self._words
+    
+    def __getitem__(self, index):
+        return self.tolist()[index]
+    
+    def __len__(self) -> int:
+        return len(self.tolist())
+    
+    def __bool__(self) -> bool:
+        return any(text.split() for text in self._texts)
+    
+    def __repr__(self) -> str:
+        return f"WordList({self.tolist()!r})"
+
+
+def _cpu_supports_bf16() -> bool:
+    """True se a CPU executa BF16 nativamente (AVX512-BF16 ou AMX-BF16)"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    flags = line.split(':', 1)[1].split()
+                    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        pass
+    return False
+
+
+@contextmanager
+def _mkldnn_int8(model_dirs: Iterable[str]):
+    """Ativa enable_mkldnn_int8() nos predictors criados dos modelos em model_dirs
+
+    O PaddleOCR 2.7 só chama enable_mkldnn(): sem o passe INT8 do oneDNN os nós
+    de (de)quantização dos modelos PTQ rodam como simulação em FP32, mais lenta
+    que o modelo original. Os demais modelos (ex.: classificador) seguem em FP32.
+    """
+    model_dirs = tuple(os.path.abspath(d) + os.sep for d in model_dirs)
+    if not model_dirs:
+        yield
+        return
+
+    from paddle import inference
+    enable_mkldnn = inference.Config.enable_mkldnn
+
+    def enable_mkldnn_with_int8(config):
+        enable_mkldnn(config)
+        if os.path.abspath(config.prog_file()).startswith(model_dirs):
+            config.enable_mkldnn_int8()
+
+    inference.Config.enable_mkldnn = enable_mkldnn_with_int8
+    try:
+        yield
+    finally:
+        inference.Config.enable_mkldnn = enable_mkldnn
+
+
 class MedicalOCRProcessor:
     """Processador principal para OCR de exames médicos"""
     
@@ -34,6 +128,19 @@ class MedicalOCRProcessor:
         self.config = config_module.config # Usar a instância importada
         self.ocr_engine = None
         self.structure_engine = None
+        # Os predictors do Paddle não são thread-safe: cada inferência empresta um
+        # conjunto de engines exclusivo. Com OCR_ENGINE_POOL_SIZE=1 (padrão) isso
+        # serializa a inferência e o restante da requisição roda em paralelo.
+        # None representa o conjunto principal (self.ocr_engine/self.structure_engine)
+        self._engine_pool: queue.Queue = queue.Queue()
+        self._engine_pool.put(None)
+        self._engine_replicas: List[tuple] = []
+        # Reciclagem dos engines contra o crescimento de memória do Paddle
+        self._call_count = 0
+        self._recycle_lock = threading.Lock()
+        # LRU de resultados por SHA-256 do arquivo + parâmetros: (instante, resultado)
+        self._result_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
         self._initialize_engines()
     
     def _initialize_engines(self):
@@ -42,68 +149,301 @@ class MedicalOCRProcessor:
             logger.warning("PaddleOCR não disponível - usando modo mock")
             return
         
+        acceleration = self._acceleration_kwargs()
+        pool_size = self._engine_pool_size()
+        threads_kwargs = {}
+        if pool_size > 1 and 'cpu_threads' not in acceleration:
+            # Dividir os núcleos entre as réplicas em vez de cada uma usar todos
+            threads_kwargs['cpu_threads'] = max(1, (os.cpu_count() or 1) // pool_size)
+        
         try:
             # Inicializar PaddleOCR principal
-            self.ocr_engine = PaddleOCR(
+            base_kwargs = dict(
                 use_angle_cls=self.config.USE_ANGLE_CLS,
                 lang=self.config.PADDLE_OCR_LANG,
                 use_gpu=self.config.ENABLE_GPU,
                 show_log=False,
-                use_space_char=self.config.USE_SPACE_CHAR
+                use_space_char=self.config.USE_SPACE_CHAR,
+                rec_batch_num=self._rec_batch_num(),
+                det_limit_side_len=self.config.DET_LIMIT_SIDE_LEN,
+                det_db_box_thresh=self.config.DET_DB_BOX_THRESH,
+                drop_score=self.config.OCR_DROP_SCORE,
+                **threads_kwargs
             )
+            ocr_kwargs = dict(acceleration)
+            int8_dirs: Dict[str, str] = {}
+            if acceleration.get('use_tensorrt'):
+                ocr_kwargs.update(self._tensorrt_model_dirs(acceleration.get('precision', 'fp32')))
+            elif not self.config.ENABLE_GPU and self.config.HPI_PRECISION == 'int8':
+                if acceleration.get('enable_mkldnn'):
+                    int8_dirs = self._int8_model_dirs(base_kwargs, ocr_kwargs)
+                    ocr_kwargs.update(int8_dirs)
+                else:
+                    # Sem oneDNN não há kernels INT8: os nós de (de)quantização rodariam
+                    # como simulação em FP32, mais lenta e menos precisa que o modelo original
+                    logger.warning("HPI_PRECISION=int8 requer o backend MKLDNN na CPU "
+                                   "(ENABLE_HPI=true, HPI_BACKEND=mkldnn/auto); usando FP32")
+            try:
+                with _mkldnn_int8(int8_dirs.values()):
+                    self.ocr_engine = PaddleOCR(**base_kwargs, **ocr_kwargs)
+            except Exception as e:
+                if not acceleration:
+                    raise
+                # Backend acelerado indisponível nesta instalação: voltar ao padrão
+                logger.warning("Aceleração da inferência indisponível, usando backend padrão",
+                               error=str(e), acceleration=acceleration)
+                acceleration = ocr_kwargs = {}
+                self.ocr_engine = PaddleOCR(**base_kwargs)
+            structure_kwargs = dict(acceleration, **threads_kwargs)
             
             # Inicializar PP-Structure para layout e tabelas
+            self.structure_engine = self._create_structure_engine(structure_kwargs)
+            
+            # Réplicas para inferência paralela na CPU (ex.: páginas de um PDF)
             try:
-                from paddleocr import PPStructure
-                # O modelo de layout do PP-Structure suporta apenas 'en' e 'ch'.
-                # Usamos 'en' para análise de layout, o OCR principal ainda usará 'pt'.
-                structure_lang = 'en'
-                self.structure_engine = PPStructure(
-                    use_gpu=self.config.ENABLE_GPU,
-                    show_log=False,
-                    lang=structure_lang,
-                    layout=True,
-                    table=True,
-                    ocr=True
-                )
-                logger.info("PP-Structure inicializado com sucesso", lang=structure_lang)
+                for _ in range(pool_size - 1):
+                    with _mkldnn_int8(int8_dirs.values()):
+                        ocr_replica = PaddleOCR(**base_kwargs, **ocr_kwargs)
+                    replica = (
+                        ocr_replica,
+                        self._create_structure_engine(structure_kwargs) if self.structure_engine else None
+                    )
+                    self._engine_replicas.append(replica)
+                    self._engine_pool.put(replica)
             except Exception as e:
-                logger.warning("PP-Structure não disponível", error=str(e))
-                self.structure_engine = None
+                logger.warning("Falha ao criar réplica dos engines; seguindo com as já criadas",
+                               error=str(e), engine_pool_size=self._engine_count)
             
             logger.info("PaddleOCR inicializado com sucesso", 
                        gpu_enabled=self.config.ENABLE_GPU,
-                       language=self.config.PADDLE_OCR_LANG)
+                       language=self.config.PADDLE_OCR_LANG,
+                       acceleration=acceleration,
+                       engine_pool_size=self._engine_count)
             
         except Exception as e:
             logger.error("Erro ao inicializar PaddleOCR", error=str(e))
             self.ocr_engine = None
             self.structure_engine = None
+            return
+        
+        if self.config.OCR_WARMUP:
+            self._warmup_engines(acceleration)
+    
+    def _create_structure_engine(self, acceleration: Dict[str, Any]):
+        """Cria o PP-Structure (layout + tabelas); None se indisponível"""
+        try:
+            from paddleocr import PPStructure
+            # O modelo de layout do PP-Structure suporta apenas 'en' e 'ch'.
+            # Usamos 'en' para análise de layout, o OCR principal ainda usará 'pt'.
+            structure_lang = 'en'
+            engine = PPStructure(
+                use_gpu=self.config.ENABLE_GPU,
+                show_log=False,
+                lang=structure_lang,
+                layout=True,
+                table=True,
+                ocr=True,
+                det_db_box_thresh=self.config.DET_DB_BOX_THRESH,
+                drop_score=self.config.OCR_DROP_SCORE,
+                **acceleration
+            )
+            logger.info("PP-Structure inicializado com sucesso", lang=structure_lang)
+            return engine
+        except Exception as e:
+            logger.warning("PP-Structure não disponível", error=str(e))
+            return None
+    
+    def _engine_pool_size(self) -> int:
+        """Conjuntos de engines independentes (1 na GPU: lotes já ocupam o device)"""
+        if self.config.ENABLE_GPU:
+            return 1
+        return max(1, self.config.OCR_ENGINE_POOL_SIZE)
+    
+    @property
+    def _engine_count(self) -> int:
+        """Conjuntos de engines no pool (principal + réplicas)"""
+        return 1 + len(self._engine_replicas)
+    
+    @contextmanager
+    def _borrow_engines(self) -> Iterator[tuple]:
+        """Empresta (ocr_engine, structure_engine) exclusivos durante a inferência"""
+        slot = self._engine_pool.get()
+        try:
+            yield slot if slot is not None else (self.ocr_engine, self.structure_engine)
+        finally:
+            self._engine_pool.put(slot)
+    
+    def _warmup_engines(self, acceleration: Dict[str, Any]):
+        """Executa inferências descartáveis para a 1ª requisição não pagar a
+        inicialização preguiçosa do Paddle (alocação de memória, escolha de
+        kernels oneDNN/cuDNN, construção de engines TensorRT por shape)"""
+        start_time = time.time()
+        
+        # Várias linhas de texto: det, cls e rec rodam, e o rec monta um lote cheio
+        sizes = [(960, 640)]
+        if self.config.ENABLE_GPU or acceleration.get('use_tensorrt'):
+            # Shapes dinâmicos: aquecer também no tamanho típico de página renderizada
+            sizes.append((self.config.DET_LIMIT_SIDE_LEN, int(self.config.DET_LIMIT_SIDE_LEN * 1.414)))
+        
+        try:
+            for width, height in sizes:
+                warmup = np.full((height, width, 3), 255, np.uint8)
+                for i in range(max(self._rec_batch_num(), 3)):
+                    y = 60 + i * 50
+                    if y >= height - 20:
+                        break
+                    cv2.putText(warmup, f'Hemoglobina {12 + i},5 g/dL', (40, y),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+                # Todas as réplicas: cada predictor aloca seus próprios buffers. Só roda na
+                # criação/recriação dos engines, quando nenhuma requisição os usa
+                for ocr_engine, structure_engine in [(self.ocr_engine, self.structure_engine), *self._engine_replicas]:
+                    ocr_engine.ocr(warmup, cls=self.config.USE_ANGLE_CLS)
+                    if structure_engine:
+                        structure_engine(warmup)
+            
+            logger.info("Engines OCR aquecidos",
+                        warmup_time_ms=round((time.time() - start_time) * 1000, 1),
+                        shapes=sizes)
+        except Exception as e:
+            # Aquecimento é otimização: falhas aparecem de novo (e com contexto) na 1ª requisição
+            logger.warning("Falha no aquecimento do OCR", error=str(e))
+    
+    def _acceleration_kwargs(self) -> Dict[str, Any]:
+        """Argumentos de backend de inferência para PaddleOCR/PPStructure (2.7)
+        
+        O PaddleOCR 2.7 não tem o modo HPI do 3.x; o equivalente é escolher o
+        backend do Paddle Inference: oneDNN (MKLDNN) na CPU, TensorRT na GPU, e a
+        precisão (fp16 na GPU, bf16 no oneDNN; int8 na CPU usa modelos quantizados,
+        ver _int8_model_dirs).
+        """
+        if not self.config.ENABLE_HPI:
+            return {}
+        
+        backend = self.config.HPI_BACKEND
+        if backend == 'auto':
+            backend = 'paddle' if self.config.ENABLE_GPU else 'mkldnn'
+        
+        kwargs: Dict[str, Any] = {}
+        if backend == 'mkldnn':
+            kwargs['enable_mkldnn'] = True
+        elif backend == 'tensorrt':
+            if self.config.ENABLE_GPU:
+                kwargs['use_tensorrt'] = True
+            else:
+                logger.warning("HPI_BACKEND=tensorrt requer ENABLE_GPU; ignorando")
+        elif backend != 'paddle':
+            logger.warning("HPI_BACKEND não suportado pelo PaddleOCR 2.7; usando padrão", backend=backend)
+        
+        # Precisão automática: FP16 (Tensor Cores) com TensorRT, BF16 no oneDNN se a
+        # CPU tem AVX512-BF16/AMX, FP32 nos demais
+        cpu_bf16 = kwargs.get('enable_mkldnn') and not self.config.ENABLE_GPU and _cpu_supports_bf16()
+        precision = self.config.HPI_PRECISION or (
+            'fp16' if kwargs.get('use_tensorrt') else 'bf16' if cpu_bf16 else 'fp32'
+        )
+        if self.config.ENABLE_GPU and precision in ('fp16', 'int8'):
+            kwargs['precision'] = precision
+        elif precision == 'bf16':
+            if cpu_bf16:
+                # No PaddleOCR 2.7, precision=fp16 com MKLDNN ativa enable_mkldnn_bfloat16()
+                kwargs['precision'] = 'fp16'
+            else:
+                logger.warning("HPI_PRECISION=bf16 requer MKLDNN na CPU com AVX512-BF16/AMX; usando FP32")
+        if self.config.CPU_THREADS > 0:
+            kwargs['cpu_threads'] = self.config.CPU_THREADS
+        
+        return kwargs
+    
+    def _rec_batch_num(self) -> int:
+        """Tamanho do lote do reconhecimento: todas as linhas detectadas em uma
+        página são reconhecidas em lotes deste tamanho
+        
+        Na GPU, lotes maiores amortizam o custo de lançamento dos kernels; na
+        CPU o ganho é pequeno e cada linha extra no lote aumenta o pico de memória.
+        """
+        if self.config.REC_BATCH_NUM > 0:
+            return self.config.REC_BATCH_NUM
+        return 8 if self.config.ENABLE_GPU else 1
+    
+    def _tensorrt_model_dirs(self, precision: str) -> Dict[str, str]:
+        """Diretórios det/rec/cls por GPU (SM), precisão e idioma para o TensorRT
+        
+        O PaddleOCR 2.7 grava o perfil de shapes dinâmicos do TensorRT
+        ({det,rec,cls}_trt_dynamic_shape.txt) no diretório do modelo: o primeiro
+        start coleta o perfil e os seguintes constroem os engines já ajustados.
+        Separar por SM evita reaproveitar o perfil de outra GPU; os modelos são
+        baixados para esses diretórios automaticamente se não existirem.
+        """
+        try:
+            import paddle
+            major, minor = paddle.device.cuda.get_device_capability()
+            gpu_key = f'sm{major}{minor}'
+        except Exception:
+            gpu_key = 'gpu'
+        
+        base = os.path.join(self.config.TRT_CACHE_DIR, f'{gpu_key}_{precision}', self.config.PADDLE_OCR_LANG)
+        return {
+            'det_model_dir': os.path.join(base, 'det'),
+            'rec_model_dir': os.path.join(base, 'rec'),
+            'cls_model_dir': os.path.join(base, 'cls')
+        }
+    
+    def _int8_model_dirs(self, base_kwargs: Dict[str, Any], ocr_kwargs: Dict[str, Any]) -> Dict[str, str]:
+        """Diretórios det/rec INT8 para a CPU, quantizando no primeiro start
+        
+        A PTQ usa um PaddleOCR FP32 temporário (modelos originais + detector para
+        recortar as linhas de calibração). Sem PaddleSlim ou sem imagens de
+        calibração, retorna {} e o engine segue em FP32.
+        """
+        model_dirs = model_quantization.quantized_model_dirs(self.config.QUANT_CACHE_DIR, self.config.PADDLE_OCR_LANG)
+        if model_quantization.is_quantized(model_dirs):
+            return model_dirs
+        
+        images = model_quantization.load_calibration_images(
+            self.config.QUANT_CALIBRATION_DIR, self.config.QUANT_CALIBRATION_SAMPLES
+        )
+        if not model_quantization.PADDLESLIM_AVAILABLE or not images:
+            logger.warning("INT8 indisponível (requer paddleslim e QUANT_CALIBRATION_DIR); usando FP32",
+                           paddleslim=model_quantization.PADDLESLIM_AVAILABLE, calibration_images=len(images))
+            return {}
+        
+        try:
+            start_time = time.time()
+            fp32_engine = PaddleOCR(**base_kwargs, **ocr_kwargs)
+            model_quantization.quantize_ocr_models(fp32_engine, images, model_dirs)
+            logger.info("Quantização INT8 concluída", quant_time_s=round(time.time() - start_time, 1))
+            return model_dirs
+        except Exception as e:
+            logger.warning("Falha na quantização INT8; usando FP32", error=str(e))
+            return {}
     
     def test_connection(self):
         """Testa se o PaddleOCR está funcionando"""
-        if not self.ocr_engine:
-            raise Exception("PaddleOCR não inicializado")
-        
         # Criar imagem de teste simples
         test_image = np.ones((100, 300, 3), dtype=np.uint8) * 255
         cv2.putText(test_image, 'TEST', (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
         
-        try:
-            result = self.ocr_engine.ocr(test_image, cls=False)
-            return True
-        except Exception as e:
-            raise Exception(f"Teste do PaddleOCR falhou: {str(e)}")
+        # Engine emprestado do pool: espera uma reciclagem em andamento terminar
+        with self._borrow_engines() as (ocr_engine, _):
+            if not ocr_engine:
+                raise Exception("PaddleOCR não inicializado")
+            try:
+                result = ocr_engine.ocr(test_image, cls=False)
+                return True
+            except Exception as e:
+                raise Exception(f"Teste do PaddleOCR falhou: {str(e)}")
     
     def process_file(self, 
-                    file_data: Union[bytes, str], 
+                    file_data: Union[bytes, str, os.PathLike, BinaryIO, np.ndarray], 
                     file_extension: str = 'jpg',
                     **kwargs) -> Dict[str, Any]:
         """
         Processa arquivo com PaddleOCR
         
         Args:
-            file_data: Dados do arquivo (bytes) ou caminho (str)
+            file_data: Dados do arquivo (bytes), caminho (str/PathLike), arquivo
+                binário aberto ou imagem já decodificada (np.ndarray BGR uint8).
+                PDFs passados por caminho são lidos do disco sob demanda, sem
+                carregar o arquivo inteiro na memória
             file_extension: Extensão do arquivo
             **kwargs: Parâmetros adicionais
         
@@ -112,11 +452,26 @@ class MedicalOCRProcessor:
         """
         start_time = time.time()
         
+        cache_key = None
+        if isinstance(file_data, bytes) and self.config.RESULT_CACHE_SIZE > 0:
+            cache_key = self._result_cache_key(file_data, file_extension, kwargs)
+            cached = self._result_cache_get(cache_key)
+            if cached is not None:
+                logger.info("Resultado reaproveitado do cache em memória", method=cached.get('method'))
+                return cached
+        
         try:
-            if file_extension.lower() == 'pdf':
-                return self._process_pdf(file_data, **kwargs)
+            if isinstance(file_data, np.ndarray):
+                # Imagem já decodificada pelo pré-processamento: sem re-decode
+                result = self._process_image_array(file_data, **kwargs)
+            elif file_extension.lower() == 'pdf':
+                result = self._process_pdf(file_data, **kwargs)
             else:
-                return self._process_image(file_data, **kwargs)
+                result = self._process_image(file_data, **kwargs)
+            
+            if cache_key is not None:
+                self._result_cache_put(cache_key, result)
+            return result
                 
         except Exception as e:
             logger.error("Erro no processamento", error=str(e))
@@ -126,144 +481,324 @@ class MedicalOCRProcessor:
                 'error': str(e),
                 'processing_time': time.time() - start_time
             }
+        finally:
+            self._maybe_recycle_engines()
+    
+    def _maybe_recycle_engines(self):
+        """Recria os engines após OCR_RECYCLE_INTERVAL arquivos ou acima de OCR_MAX_RSS_MB
+        
+        Os predictors do Paddle acumulam memória ao longo das chamadas (caches de
+        shapes do oneDNN, arenas do alocador). A recriação espera as inferências em
+        andamento devolverem seus engines e roda na thread da requisição que
+        cruzou o limite.
+        """
+        interval = self.config.OCR_RECYCLE_INTERVAL
+        max_rss_mb = self.config.OCR_MAX_RSS_MB
+        if (interval <= 0 and max_rss_mb <= 0) or not self.ocr_engine:
+            return
+        
+        with self._recycle_lock:
+            self._call_count += 1
+            rss_before = current_rss_mb()
+            if interval > 0 and self._call_count >= interval:
+                reason = 'interval'
+            elif max_rss_mb > 0 and rss_before > max_rss_mb:
+                reason = 'rss'
+            else:
+                return
+            
+            start_time = time.time()
+            # Tomar todos os conjuntos de engines: nenhuma inferência em andamento
+            slots = [self._engine_pool.get() for _ in range(self._engine_count)]
+            try:
+                slots.clear()
+                self._teardown_engines()
+                self._initialize_engines()
+            finally:
+                self._engine_pool.put(None)
+            self._call_count = 0
+            
+            logger.info("Engines OCR recriados", reason=reason,
+                        memory_reclaimed_mb=round(rss_before - current_rss_mb(), 1),
+                        recycle_time_s=round(time.time() - start_time, 2))
+    
+    def _teardown_engines(self):
+        """Libera os predictors atuais (e as réplicas já retiradas do pool)"""
+        self.ocr_engine = None
+        self.structure_engine = None
+        self._engine_replicas = []
+        gc.collect()
+        if self.config.ENABLE_GPU:
+            try:
+                import paddle
+                paddle.device.cuda.empty_cache()
+            except Exception as e:
+                logger.warning("Falha ao liberar o cache da GPU", error=str(e))
     
-    def _process_pdf(self, file_data: bytes, **kwargs) -> Dict[str, Any]:
+    @staticmethod
+    def _result_cache_key(file_data: bytes, file_extension: str, kwargs: Dict[str, Any]) -> str:
+        """SHA-256 do arquivo + extensão + parâmetros que afetam o resultado"""
+        h = hashlib.sha256(file_data)
+        h.update(file_extension.lower().encode())
+        h.update(repr(sorted(kwargs.items())).encode())
+        return h.hexdigest()
+    
+    def _result_cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Resultado em cache (cópia rasa) ou None se ausente/expirado"""
+        with self._result_cache_lock:
+            entry = self._result_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.config.RESULT_CACHE_TTL:
+                del self._result_cache[key]
+                return None
+            self._result_cache.move_to_end(key)
+            return dict(result)
+    
+    def _result_cache_put(self, key: str, result: Dict[str, Any]):
+        """Guarda o resultado, descartando os menos usados acima de RESULT_CACHE_SIZE"""
+        if result.get('error'):
+            return
+        with self._result_cache_lock:
+            self._result_cache[key] = (time.monotonic(), dict(result))
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.config.RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    def _process_pdf(self, file_data: Union[bytes, str, os.PathLike, BinaryIO], **kwargs) -> Dict[str, Any]:
         """Processa arquivo PDF"""
         start_time = time.time()
         
         try:
-            # Primeiro, tentar extrair texto diretamente
-            direct_text = self._extract_pdf_text_direct(file_data)
-            direct_text_length = len(direct_text.strip()) if direct_text else 0
+            # O PDF é aberto (parseado) uma única vez: o mesmo documento serve à
+            # extração direta de texto e à renderização das páginas, e é fechado
+            # ao sair do bloco (inclusive em erro)
+            with self._open_pdf(file_data) as doc:
+            
+                # Primeiro, tentar extrair texto diretamente
+                direct_text = self._extract_pdf_text_direct(doc)
+                direct_text_length = len(direct_text)  # já vem sem espaços nas bordas
+            
+                logger.info(f"Extração direta de texto: {direct_text_length} caracteres")
+            
+                if direct_text and direct_text_length > 50:  # Reduzido de 100 para 50
+                    logger.info("PDF com texto pesquisável detectado", text_length=direct_text_length)
+                    return {
+                        'text': direct_text,
+                        'confidence': 0.95,
+                        'method': 'direct_text_extraction',
+                        'processing_time': time.time() - start_time,
+                        'pages_processed': 1
+                    }
+            
+                # Se não há texto suficiente, renderizar as páginas com PyMuPDF em uma
+                # thread própria enquanto a página anterior passa pelo OCR
+                page_count = len(doc)
+                logger.info(f"Texto insuficiente, renderizando {page_count} páginas com PyMuPDF para OCR")
+                pages = self._prefetch(
+                    self._iter_pdf_pages_with_fitz(doc, high_quality=kwargs.get('high_quality', False)),
+                    self.config.PDF_PREFETCH_PAGES
+                )
             
-            logger.info(f"Extração direta de texto: {direct_text_length} caracteres")
+                # Com réplicas de engines, várias páginas passam pelo OCR ao mesmo tempo
+                page_results = self._map_ordered(
+                    lambda image: self._process_image_array(image, _from_pdf=True, **kwargs),
+                    pages,
+                    self._engine_count
+                )
             
-            if direct_text and direct_text_length > 50:  # Reduzido de 100 para 50
-                logger.info("PDF com texto pesquisável detectado", text_length=direct_text_length)
-                return {
-                    'text': direct_text,
-                    'confidence': 0.95,
-                    'method': 'direct_text_extraction',
-                    'processing_time': time.time() - start_time,
-                    'pages_processed': 1
-                }
+                all_results = []
+                combined_text = ""
+                total_confidence = 0
             
-            # Se não há texto suficiente, tentar usar PyMuPDF para converter páginas
-            logger.info("Texto insuficiente, tentando OCR com PyMuPDF")
-            try:
-                images = self._pdf_to_images_with_fitz(file_data)
-                logger.info(f"Convertido para {len(images)} imagens usando PyMuPDF")
-            except Exception as fitz_error:
-                logger.warning(f"PyMuPDF falhou: {fitz_error}, tentando pdf2image")
-                # Fallback para pdf2image (que precisa do Poppler)
-                images = self._pdf_to_images(file_data)
-                logger.info(f"Convertido para {len(images)} imagens usando pdf2image")
-            
-            all_results = []
-            combined_text = ""
-            total_confidence = 0
-            
-            for i, image in enumerate(images):
-                logger.info(f"Processando página {i+1}/{len(images)}")
+                try:
+                    for i, page_result in enumerate(page_results):
+                        logger.info(f"Página {i+1}/{page_count} processada")
 
-                page_result = self._process_image_array(image, _from_pdf=True, **kwargs)
-                all_results.append(page_result)
-                
-                if page_result.get('text'):
-                    combined_text += f"\n--- Página {i+1} ---\n"
-                    combined_text += page_result['text']
-                    combined_text += "\n"
-                
-                total_confidence += page_result.get('confidence', 0)
+                        all_results.append(page_result)
+                    
+                        if page_result.get('text'):
+                            combined_text += f"\n--- Página {i+1} ---\n"
+                            combined_text += page_result['text']
+                            combined_text += "\n"
+                    
+                        total_confidence += page_result.get('confidence', 0)
+                finally:
+                    # Encerrar as threads de OCR e de renderização mesmo se uma página falhar
+                    page_results.close()
+                    close = getattr(pages, 'close', None)
+                    if close is not None:
+                        close()
             
-            avg_confidence = total_confidence / len(images) if images else 0
+                avg_confidence = total_confidence / len(all_results) if all_results else 0
             
-            return {
-                'text': combined_text.strip(),
-                'confidence': avg_confidence,
-                'method': 'ocr_from_images',
-                'processing_time': time.time() - start_time,
-                'pages_processed': len(images),
-                'page_results': all_results
-            }
+                return {
+                    'text': combined_text.strip(),
+                    'confidence': avg_confidence,
+                    'method': 'ocr_from_images',
+                    'processing_time': time.time() - start_time,
+                    'pages_processed': len(all_results),
+                    'page_results': all_results
+                }
             
         except Exception as e:
             logger.error("Erro no processamento de PDF", error=str(e))
             raise
     
-    def _extract_pdf_text_direct(self, file_data: bytes) -> str:
-        """Extrai texto diretamente do PDF se disponível"""
+    @staticmethod
+    def _open_pdf(file_data: Union[bytes, str, os.PathLike, BinaryIO]):
+        """Abre o PDF no PyMuPDF
+        
+        Por caminho, o MuPDF lê do arquivo só os objetos necessários (páginas sob
+        demanda), então a memória não cresce com o tamanho do PDF. Arquivos abertos
+        que correspondem a um arquivo em disco são reabertos pelo caminho; os
+        demais (ex.: buffers em memória) são lidos para bytes.
+        """
+        if isinstance(file_data, (str, os.PathLike)):
+            return fitz.open(os.fspath(file_data), filetype="pdf")
+        if hasattr(file_data, 'read'):
+            name = getattr(file_data, 'name', None)
+            if isinstance(name, str) and os.path.isfile(name):
+                return fitz.open(name, filetype="pdf")
+            file_data = file_data.read()
+        return fitz.open(stream=file_data, filetype="pdf")
+    
+    def _extract_pdf_text_direct(self, doc) -> str:
+        """Extrai texto diretamente do PDF (documento PyMuPDF já aberto) se disponível"""
         try:
-            doc = fitz.open(stream=file_data, filetype="pdf")
-            text = ""
+            # O texto extraído é o próprio resultado do caminho rápido, então todas as
+            # páginas são lidas; parar no limiar de 50 caracteres truncaria o laudo
+            parts = []
             
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
+            for page_num, page in enumerate(doc):
                 page_text = page.get_text()
                 if page_text.strip():
-                    text += f"\n--- Página {page_num + 1} ---\n"
-                    text += page_text
+                    parts.append(f"\n--- Página {page_num + 1} ---\n")
+                    parts.append(page_text)
             
-            doc.close()
-            return text.strip()
+            return ''.join(parts).strip()
             
         except Exception as e:
             logger.warning("Erro na extração direta de texto do PDF", error=str(e))
             return ""
     
-    def _pdf_to_images_with_fitz(self, file_data: bytes) -> List[np.ndarray]:
-        """Converte PDF para lista de imagens usando PyMuPDF (não precisa do Poppler)"""
-        try:
-            doc = fitz.open(stream=file_data, filetype="pdf")
-            images = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Converter página para imagem com alta resolução
-                mat = fitz.Matrix(3.0, 3.0)  # 3x zoom = ~300 DPI
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Converter para numpy array
-                img_data = pix.tobytes("ppm")
-                img = Image.open(io.BytesIO(img_data))
-                np_img = np.array(img)
-                images.append(np_img)
-                
-                pix = None  # Liberar memória
-            
-            doc.close()
-            return images
-            
-        except Exception as e:
-            logger.error("Erro na conversão PDF para imagens com PyMuPDF", error=str(e))
-            raise
-
-    def _pdf_to_images(self, file_data: bytes) -> List[np.ndarray]:
-        """Converte PDF para lista de imagens usando pdf2image (precisa do Poppler)"""
-        try:
-            # Usar pdf2image para conversão
-            images = convert_from_bytes(
-                file_data,
-                dpi=300,  # Alta resolução para melhor OCR
-                fmt='RGB'
-            )
+    def _iter_pdf_pages_with_fitz(self, doc, high_quality: bool = False) -> Iterator[np.ndarray]:
+        """Renderiza as páginas de um documento PyMuPDF uma a uma
+        
+        O pixmap RGB é usado diretamente como array NumPy, sem codificar/decodificar
+        PPM nem passar pelo PIL. O documento pertence a quem o abriu.
+        """
+        for page_num in range(len(doc)):
+            page = doc.load_page(page_num)
             
-            # Converter PIL Images para numpy arrays
-            np_images = []
-            for img in images:
-                np_img = np.array(img)
-                np_images.append(np_img)
+            dpi = self._pdf_render_dpi(page.rect, high_quality)
+            mat = fitz.Matrix(dpi / 72, dpi / 72)
+            pix = page.get_pixmap(matrix=mat, alpha=False)
             
-            return np_images
+            np_img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
             
-        except Exception as e:
-            logger.error("Erro na conversão PDF para imagens com pdf2image", error=str(e))
-            raise
+            pix = None  # Liberar memória
+            yield np_img
+    
+    def _pdf_render_dpi(self, rect, high_quality: bool = False) -> float:
+        """DPI de renderização da página
+        
+        O detector reduz a imagem para DET_LIMIT_SIDE_LEN no lado maior; renderizar
+        muito acima disso só gera pixels descartados. Uma página A4 sai com a DPI
+        mínima (150) em vez de 300, ~4x menos pixels. high_quality=True força a
+        DPI máxima (fontes muito pequenas em formulários).
+        """
+        if high_quality:
+            return self.config.PDF_RENDER_DPI_MAX
+        long_side_pt = max(rect.width, rect.height) or 1
+        target_dpi = self.config.DET_LIMIT_SIDE_LEN * 72 / long_side_pt
+        return min(self.config.PDF_RENDER_DPI_MAX, max(self.config.PDF_RENDER_DPI_MIN, target_dpi))
+    
+    @staticmethod
+    def _map_ordered(fn, items: Iterable[Any], workers: int) -> Iterator[Any]:
+        """Aplica fn aos itens com até `workers` chamadas simultâneas, na ordem de entrada
+        
+        No máximo `workers` itens ficam em andamento, então um iterável preguiçoso
+        (páginas renderizadas sob demanda) não é consumido inteiro de antemão.
+        """
+        if workers <= 1:
+            for item in items:
+                yield fn(item)
+            return
+        
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-page") as executor:
+            try:
+                for item in items:
+                    pending.append(executor.submit(fn, item))
+                    if len(pending) >= workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Consumidor interrompido: não iniciar as páginas ainda na fila
+                for future in pending:
+                    future.cancel()
     
-    def _process_image(self, file_data: bytes, **kwargs) -> Dict[str, Any]:
+    @staticmethod
+    def _prefetch(items: Iterable[Any], maxsize: int) -> Iterator[Any]:
+        """Consome um iterável em uma thread produtora, com fila limitada
+        
+        A produção (ex.: renderização de páginas) se sobrepõe ao processamento
+        do consumidor; com a fila cheia o produtor bloqueia, limitando a memória
+        a maxsize itens adiantados. Exceções do produtor são relançadas no consumidor.
+        """
+        done = object()
+        buffer: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for item in items:
+                    if not put((item, None)):
+                        return
+                put((done, None))
+            except BaseException as e:
+                put((done, e))
+            finally:
+                close = getattr(items, 'close', None)
+                if close is not None:
+                    close()
+        
+        producer = threading.Thread(target=produce, name="pdf-prefetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item, error = buffer.get()
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            # Consumidor interrompido (erro no OCR): liberar o produtor
+            stop.set()
+            producer.join()
+
+    def _process_image(self, file_data: Union[bytes, str, os.PathLike, BinaryIO], **kwargs) -> Dict[str, Any]:
         """Processa arquivo de imagem"""
         try:
+            if isinstance(file_data, (str, os.PathLike)):
+                with open(file_data, 'rb') as f:
+                    file_data = f.read()
+            elif hasattr(file_data, 'read'):
+                file_data = file_data.read()
+            
             # Converter bytes para numpy array
             image_array = np.frombuffer(file_data, np.uint8)
             image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
@@ -281,9 +816,6 @@ class MedicalOCRProcessor:
         """Processa array numpy de imagem"""
         start_time = time.time()
 
-        if not self.ocr_engine:
-            raise RuntimeError("Motor OCR não inicializado. Verifique os logs para erros de inicialização do PaddleOCR.")
-
         try:
             confidence_threshold = kwargs.get('confidence_threshold', self.config.CONFIDENCE_THRESHOLD)
             # Fonte da chamada: PDF pages podem usar PP-Structure, imagens diretas não
@@ -300,15 +832,18 @@ class MedicalOCRProcessor:
             }
 
             # PP-Structure APENAS para páginas de PDF (onde há tabelas complexas)
-            # Para imagens diretas (fotos de exame), usar OCR básico — 5-10x mais rápido
-            if self.structure_engine and (extract_tables or extract_layout):
+            # Para imagens diretas (fotos de exame), usar OCR básico — 5-10x mais rápido.
+            # A disponibilidade dos engines só é verificada com o conjunto emprestado
+            # do pool: durante uma reciclagem a requisição espera os engines novos
+            structure_result = None
+            if extract_tables or extract_layout:
                 try:
                     structure_result = self._process_with_structure(image, **kwargs)
-                    result.update(structure_result)
                 except Exception as e:
                     logger.warning("Erro no PP-Structure, usando OCR básico", error=str(e))
-                    basic_result = self._process_with_basic_ocr(image, confidence_threshold)
-                    result.update(basic_result)
+            
+            if structure_result is not None:
+                result.update(structure_result)
             else:
                 # OCR básico — rápido e suficiente para fotos de exames
                 basic_result = self._process_with_basic_ocr(image, confidence_threshold)
@@ -321,16 +856,19 @@ class MedicalOCRProcessor:
             logger.error("Erro no processamento da imagem", error=str(e))
             raise
     
-    def _process_with_structure(self, image: np.ndarray, **kwargs) -> Dict[str, Any]:
-        """Processa imagem com PP-Structure para layout e tabelas"""
+    def _process_with_structure(self, image: np.ndarray, **kwargs) -> Optional[Dict[str, Any]]:
+        """Processa imagem com PP-Structure para layout e tabelas (None se indisponível)"""
         try:
             # Processar com PP-Structure
-            structure_result = self.structure_engine(image)
+            with self._borrow_engines() as (_, structure_engine):
+                if not structure_engine:
+                    return None
+                structure_result = structure_engine(image)
             
             text_parts = []
             tables = []
             layout_elements = []
-            all_words = []
+            all_words = WordList()
             confidences = []
             
             for region in structure_result:
@@ -352,14 +890,8 @@ class MedicalOCRProcessor:
                                 if line_confidence >= kwargs.get('confidence_threshold', 0.7):
                                     text_parts.append(line_text)
                                     
-                                    # Adicionar palavras individuais
-                                    words = line_text.split()
-                                    for word in words:
-                                        all_words.append({
-                                            'text': word,
-                                            'confidence': line_confidence,
-                                            'bbox': region_bbox  # Simplificado
-                                        })
+                                    # Palavras individuais (expandidas sob demanda)
+                                    all_words.add_line(line_text, line_confidence, region_bbox)  # bbox simplificado
                 
                 elif region_type == 'table':
                     table_data = self._extract_table_data(region)
@@ -379,7 +911,7 @@ class MedicalOCRProcessor:
             
             # Combinar texto
             combined_text = '\n'.join(text_parts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+            avg_confidence = float(np.mean(confidences)) if confidences else 0.0
             
             return {
                 'text': combined_text,
@@ -398,7 +930,10 @@ class MedicalOCRProcessor:
         """Processa imagem com OCR básico do PaddleOCR"""
         try:
             # OCR básico
-            ocr_result = self.ocr_engine.ocr(image, cls=True)
+            with self._borrow_engines() as (ocr_engine, _):
+                if not ocr_engine:
+                    raise RuntimeError("Motor OCR não inicializado. Verifique os logs para erros de inicialização do PaddleOCR.")
+                ocr_result = ocr_engine.ocr(image, cls=True)
             
             if not ocr_result or not ocr_result[0]:
                 return {
@@ -408,34 +943,26 @@ class MedicalOCRProcessor:
                     'method': 'basic_ocr'
                 }
             
+            # Linhas válidas: (bbox, (texto, confiança))
+            lines = [
+                line for line in ocr_result[0]
+                if len(line) >= 2 and isinstance(line[1], (list, tuple)) and len(line[1]) >= 2
+            ]
+
+            # Filtro de confiança vetorizado; só as linhas aceitas voltam ao Python
+            confidences = np.fromiter((line[1][1] for line in lines), dtype=np.float64, count=len(lines))
+            keep = np.flatnonzero(confidences >= confidence_threshold)
+
             text_parts = []
-            all_words = []
-            confidences = []
-            
-            for line in ocr_result[0]:
-                if len(line) >= 2:
-                    bbox = line[0]  # Coordenadas da bounding box
-                    text_info = line[1]  # (texto, confiança)
-                    
-                    if isinstance(text_info, (list, tuple)) and len(text_info) >= 2:
-                        text = text_info[0]
-                        confidence = text_info[1]
-                        
-                        if confidence >= confidence_threshold:
-                            text_parts.append(text)
-                            confidences.append(confidence)
-                            
-                            # Adicionar palavras individuais
-                            words = text.split()
-                            for word in words:
-                                all_words.append({
-                                    'text': word,
-                                    'confidence': confidence,
-                                    'bbox': bbox
-                                })
-            
+            all_words = WordList()
+            for i in keep.tolist():
+                bbox, (text, confidence) = lines[i][0], lines[i][1][:2]
+                text_parts.append(text)
+                # Palavras individuais (expandidas sob demanda)
+                all_words.add_line(text, confidence, bbox)
+
             combined_text = '\n'.join(text_parts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+            avg_confidence = float(confidences[keep].mean()) if keep.size else 0.0
             
             return {
                 'text': combined_text,
@@ -481,7 +1008,7 @@ class MedicalOCRProcessor:
     
     def get_supported_formats(self) -> List[str]:
         """Retorna formatos suportados"""
-        return self.config.ALLOWED_EXTENSIONS
+        return sorted(self.config.ALLOWED_EXTENSIONS)
     
     def get_engine_info(self) -> Dict[str, Any]:
         """Retorna informações sobre os engines"""
@@ -8,34 +8,36 @@ import requests
 import json
 import sys
 import os
+import io
+from concurrent.futures import ThreadPoolExecutor
 
-def test_health_endpoint():
+def test_health_endpoint(session=requests, out=None):
     """Testa o endpoint de health check"""
     try:
         url = "https://ocr.essencialab.app/health"
-        print(f"Testando endpoint de health: {url}")
+        print(f"Testando endpoint de health: {url}", file=out)
         
-        response = requests.get(url, timeout=10)
-        print(f"Status Code: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
+        response = session.get(url, timeout=10)
+        print(f"Status Code: {response.status_code}", file=out)
+        print(f"Headers: {dict(response.headers)}", file=out)
         
         if response.status_code == 200:
             data = response.json()
-            print(f"Response: {json.dumps(data, indent=2)}")
+            print(f"Response: {json.dumps(data, indent=2)}", file=out)
             return True
         else:
-            print(f"Erro: {response.text}")
+            print(f"Erro: {response.text}", file=out)
             return False
             
     except Exception as e:
-        print(f"Erro ao testar health endpoint: {e}")
+        print(f"Erro ao testar health endpoint: {e}", file=out)
         return False
 
-def test_cors_preflight():
+def test_cors_preflight(session=requests, out=None):
     """Testa requisição OPTIONS (preflight CORS)"""
     try:
         url = "https://ocr.essencialab.app/ocr"
-        print(f"\nTestando CORS preflight: {url}")
+        print(f"\nTestando CORS preflight: {url}", file=out)
         
         headers = {
             'Origin': 'https://essencialab.app',
@@ -43,9 +45,9 @@ def test_cors_preflight():
             'Access-Control-Request-Headers': 'Content-Type,Authorization,X-Requested-With'
         }
         
-        response = requests.options(url, headers=headers, timeout=10)
-        print(f"Status Code: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
+        response = session.options(url, headers=headers, timeout=10)
+        print(f"Status Code: {response.status_code}", file=out)
+        print(f"Headers: {dict(response.headers)}", file=out)
         
         # Verificar headers CORS necessários
         cors_headers = {
@@ -54,38 +56,38 @@ def test_cors_preflight():
             'Access-Control-Allow-Headers': response.headers.get('Access-Control-Allow-Headers'),
         }
         
-        print(f"CORS Headers: {json.dumps(cors_headers, indent=2)}")
+        print(f"CORS Headers: {json.dumps(cors_headers, indent=2)}", file=out)
         
         if response.status_code == 200 and cors_headers['Access-Control-Allow-Origin'] == '*':
-            print("✅ CORS preflight OK")
+            print("✅ CORS preflight OK", file=out)
             return True
         else:
-            print("❌ CORS preflight falhou")
+            print("❌ CORS preflight falhou", file=out)
             return False
             
     except Exception as e:
-        print(f"Erro ao testar CORS preflight: {e}")
+        print(f"Erro ao testar CORS preflight: {e}", file=out)
         return False
 
-def test_info_endpoint():
+def test_info_endpoint(session=requests, out=None):
     """Testa o endpoint de informações da API"""
     try:
         url = "https://ocr.essencialab.app/info"
-        print(f"\nTestando endpoint de info: {url}")
+        print(f"\nTestando endpoint de info: {url}", file=out)
         
-        response = requests.get(url, timeout=10)
-        print(f"Status Code: {response.status_code}")
+        response = session.get(url, timeout=10)
+        print(f"Status Code: {response.status_code}", file=out)
         
         if response.status_code == 200:
             data = response.json()
-            print(f"API Info: {json.dumps(data, indent=2)}")
+            print(f"API Info: {json.dumps(data, indent=2)}", file=out)
             return True
         else:
-            print(f"Erro: {response.text}")
+            print(f"Erro: {response.text}", file=out)
             return False
             
     except Exception as e:
-        print(f"Erro ao testar info endpoint: {e}")
+        print(f"Erro ao testar info endpoint: {e}", file=out)
         return False
 
 def main():
@@ -99,11 +101,20 @@ def main():
         ("API Info", test_info_endpoint),
     ]
     
+    # Os testes são independentes: rodam em paralelo (tempo total ~ o mais lento)
+    # com uma sessão compartilhada, e a saída de cada um é impressa em ordem
+    def run(test_func):
+        out = io.StringIO()
+        return test_func(session, out), out.getvalue()
+    
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=len(tests)) as executor:
+        outcomes = list(executor.map(run, [test_func for _, test_func in tests]))
+    
     results = []
-    for test_name, test_func in tests:
+    for (test_name, _), (result, output) in zip(tests, outcomes):
         print(f"\n🔍 Executando: {test_name}")
         print("-" * 40)
-        result = test_func()
+        print(output, end="")
         results.append((test_name, result))
         
     print("\n" + "=" * 60)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Testes de regressão do parser médico e do pré-processamento de imagem
+
+Compara a saída atual com os snapshots em test_data/ (não precisa do servidor
+nem do PaddleOCR). Rodar com `python test_regression.py` ou pytest; depois de
+uma mudança de comportamento intencional, regravar com
+`python test_regression.py --update` e revisar o diff dos snapshots.
+"""
+
+import io
+import json
+import os
+import sys
+import hashlib
+
+import numpy as np
+import cv2
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.modified_medical_parser import MedicalParameterParser
+from utils.image_processor import ImageProcessor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data')
+PARSER_SNAPSHOT = os.path.join(DATA_DIR, 'parser_snapshot.json')
+IMAGE_SNAPSHOT = os.path.join(DATA_DIR, 'image_snapshot.json')
+
+# Laudos de entrada do parser (inclui acentos, vírgula decimal, tabelas com '|',
+# abreviações e parâmetros repetidos entre padrões específicos e gerais)
+PARSER_TEXTS = [
+    """LABORATÓRIO SÃO LUCAS
+Paciente: Maria da Silva Santos
+Idade: 45 anos  Sexo: Feminino
+RG: 12.345.678-9
+Data: 12/03/2024
+Médico: Dr. João Pereira
+HEMOGRAMA COMPLETO
+Hemoglobina: 13,5 g/dL (12,0 - 16,0)
+Hematócrito: 41,2 % (36 - 48)
+Leucócitos: 7.500 /mm³
+Plaquetas: 250000 /mm³
+Glicose: 105 mg/dL (70 a 99)
+Colesterol Total: 220 mg/dL
+HDL: 45 mg/dL
+LDL: 150 mg/dL
+Triglicerídeos: 180 mg/dL até 150
+Creatinina: 0,9 mg/dL
+Ureia: 30 mg/dL
+TSH: 2,5 mUI/L
+Vitamina D: 25 ng/mL (acima de 30)
+Ferritina | 80 | ng/mL | 15 - 150
+Sódio 140 mEq/L 135-145
+""",
+    """Exame de urina EAS
+Nome: JOSE CARLOS
+sexo: m  idade 70
+hb 9,1 ht 30 plt 90000 glicemia 300 creat 2.5 tsh 12
+Potássio: 5,9 mEq/L (3,5 - 5,0)
+""",
+    "Hb 11.2 g/dL Hemoglobina 11,2 g/dL glicose 90 mg/dL glicemia 90",
+    "ácido úrico: 5 mg/dL vitamina b12 300 pg/mL bilirrubina total 1,2 mg/dL ALT: 50 U/L AST: 20 U/L",
+    "",
+    "texto sem nada relevante aqui 123",
+]
+
+# Imagens sintéticas: (largura, altura, baixo contraste, formato, orientação EXIF)
+IMAGE_CASES = {
+    'small_png': (600, 400, False, 'PNG', None),
+    'mid_jpg_low': (1600, 1200, True, 'JPEG', None),
+    'mid_jpg': (1600, 1200, False, 'JPEG', None),
+    'big_jpg': (4032, 3024, False, 'JPEG', None),
+    'mid_jpg_o6': (1600, 1200, False, 'JPEG', 6),
+}
+
+# Tolerância da comparação de imagens (média da diferença absoluta na miniatura
+# 32x32): versões/builds do OpenCV diferem em arredondamentos, não no resultado
+IMAGE_TOLERANCE = 2.0
+
+
+def parser_output() -> dict:
+    """Saída do parser para PARSER_TEXTS e de alguns auxiliares internos"""
+    parser = MedicalParameterParser()
+    return {
+        'results': [parser.parse_medical_text(text) for text in PARSER_TEXTS],
+        'categories': [
+            parser._get_parameter_category(name)
+            for name in ['Hemoglobina', 'hb', 'Sodio', 'xyz', 'Colesterol Total', 't4 livre', 'a', 'vitamina', 'Ldl']
+        ],
+        'status': [
+            parser._determine_status('x', value, reference_range)
+            for value, reference_range in [
+                (5, {'min': 10, 'max': 20}), (8, {'min': 10, 'max': 20}), (15, {'min': 10, 'max': 20}),
+                (25, {'min': 10, 'max': 20}), (21, {'min': 10, 'max': 20}), (1, None)
+            ]
+        ],
+    }
+
+
+def _make_image(width: int, height: int, low_contrast: bool, fmt: str, orientation) -> bytes:
+    """Laudo sintético determinístico codificado em PNG/JPEG"""
+    rng = np.random.default_rng(width * height)
+    image = np.full((height, width, 3), 235 if low_contrast else 255, np.uint8)
+    color = (200, 200, 200) if low_contrast else (0, 0, 0)
+    for y in range(0, height - 40, 40):
+        cv2.putText(image, 'Hemoglobina 13,5 g/dL', (20, y + 30), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    image = np.clip(image.astype(int) + rng.integers(-10, 10, image.shape), 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    pil_image = Image.fromarray(image)
+    if orientation:
+        exif = Image.Exif()
+        exif[274] = orientation
+        pil_image.save(buffer, fmt, exif=exif)
+    else:
+        pil_image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def image_output() -> dict:
+    """Forma, digest e miniatura 32x32 (cinza) de cada imagem pré-processada"""
+    processor = ImageProcessor()
+    output = {}
+    for name, case in IMAGE_CASES.items():
+        result = processor.preprocess_image_array(_make_image(*case))
+        thumb = cv2.resize(cv2.cvtColor(result, cv2.COLOR_BGR2GRAY), (32, 32), interpolation=cv2.INTER_AREA)
+        output[name] = {
+            'shape': list(result.shape),
+            'sha256': hashlib.sha256(np.ascontiguousarray(result).tobytes()).hexdigest(),
+            'thumbnail': thumb.flatten().tolist(),
+        }
+    return output
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True, default=str)
+
+
+def _load(path: str):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_parser_snapshot():
+    """A saída do parser é idêntica ao snapshot"""
+    expected = _load(PARSER_SNAPSHOT)
+    actual = json.loads(_dumps(parser_output()))
+    assert actual == expected, "Saída do parser difere de test_data/parser_snapshot.json"
+
+
+def test_image_snapshot():
+    """O pré-processamento mantém forma e conteúdo (dentro da tolerância) das imagens"""
+    expected = _load(IMAGE_SNAPSHOT)
+    actual = image_output()
+    for name, snapshot in expected.items():
+        result = actual[name]
+        assert result['shape'] == snapshot['shape'], f"{name}: forma {result['shape']} != {snapshot['shape']}"
+        diff = np.abs(np.array(result['thumbnail'], dtype=int) - np.array(snapshot['thumbnail'], dtype=int)).mean()
+        assert diff <= IMAGE_TOLERANCE, f"{name}: diferença média {diff:.2f} na miniatura"
+        if result['sha256'] != snapshot['sha256']:
+            print(f"ℹ️  {name}: pixels não idênticos ao snapshot (diferença média {diff:.2f})")
+
+
+def update_snapshots():
+    """Regrava os snapshots com a saída atual"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for path, data in ((PARSER_SNAPSHOT, parser_output()), (IMAGE_SNAPSHOT, image_output())):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_dumps(data) + '\n')
+        print(f"📝 Snapshot atualizado: {path}")
+
+
+def main():
+    if '--update' in sys.argv:
+        update_snapshots()
+        return
+
+    results = []
+    for test in (test_parser_snapshot, test_image_snapshot):
+        try:
+            test()
+            results.append((test.__name__, True))
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            results.append((test.__name__, False))
+
+    for name, passed in results:
+        print(f"{name}: {'✅ PASSOU' if passed else '❌ FALHOU'}")
+    sys.exit(0 if all(passed for _, passed in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
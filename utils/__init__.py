@@ -2,6 +2,17 @@
 Utilitários para o serviço PaddleOCR
 """
 
+import os
+
+import cv2
+
+# O OpenCV abre por padrão um pool de getNumberOfCPUs() threads em cada operação;
+# com várias threads de requisição (gthread) e o pré-processamento em lote chamando
+# cv2 ao mesmo tempo, isso sobrecarrega os núcleos. Paralelizar entre imagens
+# rende mais: 1 thread por operação (OPENCV_THREADS=-1 volta ao padrão do OpenCV)
+cv2.setNumThreads(int(os.getenv('OPENCV_THREADS', '1')))
+cv2.setUseOptimized(True)
+
 from .image_processor import ImageProcessor
 
 __all__ = ['ImageProcessor']
@@ -0,0 +1,177 @@
+"""
+Quantização INT8 pós-treino (PTQ) dos modelos det/rec do PaddleOCR para CPU
+Usa PaddleSlim (quant_post_static) com imagens de exames como calibração
+"""
+
+import os
+import math
+from typing import Dict, List
+import numpy as np
+import cv2
+import structlog
+
+try:
+    import paddle
+    from paddleslim.quant import quant_post_static
+    PADDLESLIM_AVAILABLE = True
+except ImportError:
+    PADDLESLIM_AVAILABLE = False
+
+logger = structlog.get_logger()
+
+# Nomes esperados pelo PaddleOCR 2.7 dentro de det_model_dir/rec_model_dir
+MODEL_FILENAME = 'inference.pdmodel'
+PARAMS_FILENAME = 'inference.pdiparams'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+# Normalização do detector DB (ImageNet) e do reconhecedor SVTR/CRNN
+_DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def quantized_model_dirs(cache_dir: str, lang: str) -> Dict[str, str]:
+    """Diretórios dos modelos INT8 por idioma (o classificador de ângulo fica em FP32)"""
+    base = os.path.join(cache_dir, lang)
+    return {
+        'det_model_dir': os.path.join(base, 'det'),
+        'rec_model_dir': os.path.join(base, 'rec')
+    }
+
+
+def is_quantized(model_dirs: Dict[str, str]) -> bool:
+    """True se todos os modelos quantizados já estão no cache"""
+    return all(
+        os.path.isfile(os.path.join(model_dir, MODEL_FILENAME)) and
+        os.path.isfile(os.path.join(model_dir, PARAMS_FILENAME))
+        for model_dir in model_dirs.values()
+    )
+
+
+def load_calibration_images(calibration_dir: str, limit: int) -> List[np.ndarray]:
+    """Carrega até `limit` imagens BGR do diretório de calibração"""
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        return []
+
+    images = []
+    for name in sorted(os.listdir(calibration_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(calibration_dir, name), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def _det_input(image: np.ndarray, limit_side_len: int) -> np.ndarray:
+    """Pré-processamento do detector (DetResizeForTest 'max' + normalização), NCHW"""
+    h, w = image.shape[:2]
+    ratio = min(1.0, limit_side_len / max(h, w))
+    resize_h = max(32, int(round(h * ratio / 32)) * 32)
+    resize_w = max(32, int(round(w * ratio / 32)) * 32)
+    resized = cv2.resize(image, (resize_w, resize_h))
+    normalized = (resized.astype(np.float32) / 255.0 - _DET_MEAN) / _DET_STD
+    return normalized.transpose(2, 0, 1)[np.newaxis]
+
+
+def _rec_input(crop: np.ndarray, rec_image_shape: str) -> np.ndarray:
+    """Pré-processamento do reconhecedor (altura fixa, largura proporcional, padding), NCHW"""
+    channels, height, max_width = (int(v) for v in rec_image_shape.split(','))
+    h, w = crop.shape[:2]
+    resized_w = min(max_width, int(math.ceil(height * w / max(h, 1))))
+    resized = cv2.resize(crop, (max(1, resized_w), height)).astype(np.float32)
+    normalized = (resized / 255.0 - 0.5) / 0.5
+    padded = np.zeros((channels, height, max_width), dtype=np.float32)
+    padded[:, :, :normalized.shape[1]] = normalized.transpose(2, 0, 1)
+    return padded[np.newaxis]
+
+
+def _text_crops(engine, images: List[np.ndarray], limit: int) -> List[np.ndarray]:
+    """Recortes de linhas de texto encontrados pelo detector FP32"""
+    crops = []
+    for image in images:
+        dt_boxes, _ = engine.text_detector(image)
+        for box in dt_boxes if dt_boxes is not None else []:
+            x0, y0 = np.floor(box.min(axis=0)).astype(int)
+            x1, y1 = np.ceil(box.max(axis=0)).astype(int)
+            crop = image[max(0, y0):y1, max(0, x0):x1]
+            if crop.size:
+                crops.append(crop)
+            if len(crops) >= limit:
+                return crops
+    return crops
+
+
+class _CalibrationDataset(paddle.io.Dataset if PADDLESLIM_AVAILABLE else object):
+    """Lotes NCHW já pré-processados, um por item"""
+
+    def __init__(self, batches: List[np.ndarray]):
+        self.batches = batches
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.batches[index]
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+
+def _quantize(model_dir: str, save_dir: str, batches: List[np.ndarray]):
+    """Roda a PTQ estática (histograma/percentil) de um modelo de inferência"""
+    paddle.enable_static()
+    try:
+        executor = paddle.static.Executor(paddle.CPUPlace())
+        # O Paddle >= 2.5 só aceita paddle.io.DataLoader na PTQ (batch_generator é
+        # ignorado); a variável de entrada vem do próprio modelo
+        program, feed_names, _ = paddle.static.load_inference_model(
+            model_dir, executor, model_filename=MODEL_FILENAME, params_filename=PARAMS_FILENAME
+        )
+        data_loader = paddle.io.DataLoader(
+            _CalibrationDataset(batches),
+            feed_list=[program.global_block().var(feed_names[0])],
+            batch_size=None,
+            return_list=False
+        )
+        quant_post_static(
+            executor=executor,
+            model_dir=model_dir,
+            quantize_model_path=save_dir,
+            data_loader=data_loader,
+            model_filename=MODEL_FILENAME,
+            params_filename=PARAMS_FILENAME,
+            save_model_filename=MODEL_FILENAME,
+            save_params_filename=PARAMS_FILENAME,
+            batch_nums=len(batches),
+            algo='hist',
+            hist_percent=0.9999,
+            quantizable_op_type=['conv2d', 'depthwise_conv2d', 'mul', 'matmul', 'matmul_v2'],
+            onnx_format=True
+        )
+    finally:
+        paddle.disable_static()
+
+
+def quantize_ocr_models(engine, images: List[np.ndarray], model_dirs: Dict[str, str]) -> Dict[str, str]:
+    """Quantiza det e rec de um PaddleOCR FP32 já carregado e grava em model_dirs
+
+    O engine FP32 fornece os diretórios dos modelos originais e o detector usado
+    para recortar as linhas que calibram o reconhecedor.
+    """
+    if not PADDLESLIM_AVAILABLE:
+        raise RuntimeError("PaddleSlim não instalado (pip install paddleslim)")
+    if not images:
+        raise ValueError("Nenhuma imagem de calibração")
+
+    args = engine.args
+    det_batches = [_det_input(image, args.det_limit_side_len) for image in images]
+    rec_batches = [_rec_input(crop, args.rec_image_shape) for crop in _text_crops(engine, images, limit=len(images) * 8)]
+    if not rec_batches:
+        raise ValueError("Nenhuma linha de texto detectada nas imagens de calibração")
+
+    _quantize(args.det_model_dir, model_dirs['det_model_dir'], det_batches)
+    _quantize(args.rec_model_dir, model_dirs['rec_model_dir'], rec_batches)
+
+    logger.info("Modelos quantizados para INT8",
+                det_samples=len(det_batches), rec_samples=len(rec_batches), **model_dirs)
+    return model_dirs
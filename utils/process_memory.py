@@ -0,0 +1,35 @@
+"""
+Memória do processo, compartilhada pela reciclagem dos engines OCR e pelos hooks do Gunicorn
+"""
+
+import os
+from typing import Optional
+
+
+def current_rss_mb() -> float:
+    """RSS atual do processo em MB (/proc; fallback para o pico via getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def private_memory_mb() -> Optional[float]:
+    """Memória privada do processo em MB (Private_Clean + Private_Dirty), ou None se indisponível
+    
+    Ao contrário do RSS, não conta as páginas COW herdadas do master (preload_app)
+    enquanto o worker não as modifica: mede o que o worker acumulou depois do fork.
+    Requer /proc/self/smaps_rollup (Linux >= 4.14).
+    """
+    try:
+        private_kb = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    private_kb += int(line.split()[1])
+        return private_kb / 1024
+    except (OSError, ValueError, IndexError):
+        return None